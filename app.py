@@ -1,17 +1,27 @@
 import sys
-from typing import Optional
-from PyQt5.QtCore import Qt
+import os
+import json
+import time
+import threading
+import multiprocessing
+from typing import List, Optional
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QScrollArea,
                              QVBoxLayout, QWidget, QHBoxLayout, QPushButton,
                              QLineEdit, QFileDialog, QTextEdit, QProgressBar)
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QPalette, QColor, QPixmap, QIcon, QFont
 
-from PyQt5.QtCore import QSettings
+from PyQt5.QtCore import QSettings, QStandardPaths
 settings = QSettings("buio", "GeneraExcelAnteprime")
 
-# Import custom modules
+# Import custom modules; processor (pandas, Pillow, xlsxwriter) is imported
+# lazily where it is used, and warmed up in the background once the window is shown
 from styles import *
-from processor import *
+
+
+def warm_up_processor() -> None:
+    """Import the processing modules ahead of the first drop."""
+    import processor  # noqa: F401
 
 class DropArea(QLabel):
     def __init__(self, placeholder: str, parent: Optional[QWidget] = None) -> None:
@@ -40,11 +50,13 @@ class FileDropArea(DropArea):
             file_path = urls[0].toLocalFile()
             filename = urls[0].fileName()
             
+            from processor import check_excel_file, parse_excel_file_cached
+
             # Validate the Excel file
             is_valid, message = check_excel_file(file_path)
             if is_valid:
                 # Parse the Excel file to get information
-                success, info, parse_message = parse_excel_file(file_path)
+                success, info, parse_message = parse_excel_file_cached(file_path)
 
                 if success:
                     # Store the file path for later use
@@ -63,6 +75,17 @@ class FileDropArea(DropArea):
                         # Show only row count if no rows were removed
                         elements_info += f"\nElementi: {info['rows']}\n"
                         
+                    # List the collapsed duplicate FOTO codes in the tooltip
+                    duplicate_groups = info.get("duplicate_groups", [])
+                    if duplicate_groups:
+                        elements_info += f"\nCodici FOTO duplicati: {len(duplicate_groups)}"
+                        self.setToolTip("\n".join(
+                            f"{group['foto']}: tenuta riga {group['kept_row']}, "
+                            f"rimosse righe {', '.join(str(r) for r in group['removed_rows'])}"
+                            for group in duplicate_groups))
+                    else:
+                        self.setToolTip("")
+
                     # Update the display text with success and information
                     self.setText(elements_info)
                     self.setStyleSheet(DROP_AREA_SUCCESS)
@@ -102,9 +125,12 @@ class FolderDropArea(DropArea):
             # Extract folder name from path
             print(f"DEBUG: Folder name: {foldername}")
             
-            # Check the folder for images
+            # Check the folder for images. Only the folder listing is read
+            # here, on the GUI thread: the image headers are checked by the
+            # generation run, for the photos of the sheet only
+            from processor import check_image_folder
             print(f"DEBUG: Calling check_image_folder")
-            success, info, message = check_image_folder(folder_path)
+            success, info, message = check_image_folder(folder_path, scan_headers=False)
             print(f"DEBUG: check_image_folder results: success={success}, message={message}")
             
             if success:
@@ -130,9 +156,85 @@ class FolderDropArea(DropArea):
                 self.setStyleSheet(DROP_AREA_ERROR)
                 self.file_path = None
 
+class GenerationWorker(QThread):
+    """Runs process_files off the GUI thread and reports back through signals."""
+
+    progress = pyqtSignal(int, int)
+    status = pyqtSignal(str)
+    processing_finished = pyqtSignal(bool, dict)
+
+    # At most 20 progress (and status) updates per second reach the GUI; a
+    # status message that comes too soon is shown when the interval is over,
+    # unless a newer one replaces it
+    UPDATE_INTERVAL = 0.05
+
+    def __init__(self, excel_path: str, images_folder: str, output_path: str,
+                 options: dict, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self.excel_path = excel_path
+        self.images_folder = images_folder
+        self.output_path = output_path
+        self.options = options
+        self._cancel_requested = False
+        self._last_progress = 0.0
+        self._last_status = 0.0
+        self._pending_status: Optional[str] = None
+        self._status_lock = threading.Lock()
+        # Lives in the GUI thread, which has an event loop (run() has none)
+        self._status_timer = QTimer(self)
+        self._status_timer.setInterval(int(self.UPDATE_INTERVAL * 1000))
+        self._status_timer.timeout.connect(self.flush_status)
+        self.started.connect(self._status_timer.start)
+        self.finished.connect(self._status_timer.stop)
+
+    def cancel(self) -> None:
+        """Ask the running generation to stop at the next row."""
+        self._cancel_requested = True
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_requested
+
+    def report_progress(self, current: int, total: int) -> None:
+        now = time.monotonic()
+        if current == total or now - self._last_progress >= self.UPDATE_INTERVAL:
+            self._last_progress = now
+            self.progress.emit(current, total)
+
+    def report_status(self, message: str) -> None:
+        with self._status_lock:
+            now = time.monotonic()
+            if now - self._last_status >= self.UPDATE_INTERVAL:
+                self._last_status = now
+                self._pending_status = None
+                self.status.emit(message)
+            else:
+                self._pending_status = message
+
+    def flush_status(self) -> None:
+        """Emit the status message held back by report_status, if any."""
+        with self._status_lock:
+            message, self._pending_status = self._pending_status, None
+            if message is not None:
+                self._last_status = time.monotonic()
+                self.status.emit(message)
+
+    def run(self) -> None:
+        try:
+            from processor import process_files
+
+            success, results = process_files(self.excel_path, self.images_folder, self.output_path,
+                                             self.report_progress, self.report_status,
+                                             cancel_callback=self.is_cancelled, **self.options)
+        except Exception as e:  # process_files reports its own errors; this is a last resort
+            success, results = False, {"error": str(e)}
+        self.flush_status()
+        self.processing_finished.emit(success, results)
+
+
 class MainWindow(QMainWindow):
     def __init__(self) -> None:
         super().__init__()
+        self.worker: Optional[GenerationWorker] = None
         self.generate_button = QPushButton("Genera Output")
         self.setGeometry(100, 100, 650, 580)
         
@@ -242,7 +344,7 @@ class MainWindow(QMainWindow):
         self.generate_button = QPushButton("Genera Excel Anteprime")
         self.generate_button.setStyleSheet(GENERATE_BUTTON)
         self.generate_button.setCursor(Qt.PointingHandCursor)
-        self.generate_button.clicked.connect(self.generate_outputs)
+        self.generate_button.clicked.connect(self.on_generate_clicked)
         main_layout.addWidget(self.generate_button)
         
         # Add status text area for missing images
@@ -377,20 +479,70 @@ class MainWindow(QMainWindow):
             self.status_text.setStyleSheet(STATUS_TEXT_ERROR)
             return
         
-        # Define simple callbacks
-        def update_progress(current, total):
-            self.progress_bar.setMaximum(total)
-            self.progress_bar.setValue(current)
-            QApplication.processEvents()
-        
-        def update_status(message):
-            self.status_text.setText(message)
-            QApplication.processEvents()
-        
-        # Process files
-        success, results = process_files(excel_path, images_folder, output_path, 
-                                    update_progress, update_status)
+        # Extra website crops, e.g. [{"name": "400", "size": 400, "format": "WEBP"}]
+        try:
+            crop_variants = json.loads(settings.value("crop_variants", "[]") or "[]")
+        except ValueError:
+            self.status_text.setText("Errore: impostazione crop_variants non valida.")
+            self.status_text.setStyleSheet(STATUS_TEXT_ERROR)
+            return
         
+        # Run process_files on a background thread
+        options = {
+            "workers": os.cpu_count() or 1,
+            "draft_mode": settings.value("draft_mode", False, type=bool),
+            "profile": settings.value("profile", False, type=bool),
+            "thumbnails_in_memory": True,
+            # Opt-in: journal finished rows in the output folder, so an
+            # interrupted run picks up where it stopped and a rerun after
+            # editing a few cells skips the unchanged photos. Thumbnails are
+            # then written to disk (.thumbnails/) instead of kept in memory
+            "incremental": settings.value("incremental", False, type=bool),
+            "streaming": True,
+            # Photos often live on a NAS: read the next ones while decoding
+            "read_ahead_bytes": 256 * 1024**2,
+            "crop_variants": crop_variants,
+            "detail_variant": settings.value("detail_variant", "") or None,
+            "cache_dir": os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.CacheLocation), "anteprime"),
+        }
+        self.worker = GenerationWorker(excel_path, images_folder, output_path, options, self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.status.connect(self.update_status_text)
+        self.worker.processing_finished.connect(self.on_generation_finished)
+        self.worker.finished.connect(self.worker.deleteLater)
+
+        self.set_processing(True)
+        self.worker.start()
+
+    def update_progress(self, current: int, total: int) -> None:
+        """Update the progress bar."""
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(current)
+
+    def set_processing(self, processing: bool) -> None:
+        """Switch the UI between the idle and the processing state."""
+        self.generate_button.setText("Annulla" if processing else "Genera Excel Anteprime")
+        self.file_drop_area.setAcceptDrops(not processing)
+        self.folder_drop_area.setAcceptDrops(not processing)
+        self.browse_button.setEnabled(not processing)
+        self.output_path.setEnabled(not processing)
+
+    def on_generate_clicked(self) -> None:
+        """Start generation, or cancel the generation in progress."""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.generate_button.setEnabled(False)
+            self.status_text.setText("Annullamento in corso...")
+        else:
+            self.generate_outputs()
+
+    def on_generation_finished(self, success: bool, results: dict) -> None:
+        """Show the results of a finished (or cancelled) generation."""
+        self.worker = None
+        self.set_processing(False)
+        self.generate_button.setEnabled(True)
+
         # Update UI based on results
         if success:
             # Update status indicators
@@ -399,15 +551,42 @@ class MainWindow(QMainWindow):
             self.update_output_status("csv", results.get("csv_success", False))
             
             # Update status text
-            self.status_text.setText(f"Elaborazione completata!\n"
-                                    f"Righe processate: {results.get('processed_rows', 0)}\n"
-                                    f"Immagini mancanti: {results.get('missing_images', 0)}")
+            status = (f"Elaborazione completata!\n"
+                      f"Righe processate: {results.get('processed_rows', 0)}\n"
+                      f"Immagini mancanti: {results.get('missing_images', 0)}")
+            cache_stats = results.get("cache")
+            if cache_stats and cache_stats["hits"]:
+                status += f"\nImmagini riutilizzate dalla cache: {cache_stats['hits']}"
+            if results.get("resumed_rows"):
+                status += f"\nImmagini riprese dall'elaborazione precedente: {results['resumed_rows']}"
+            if results.get("changed_rows"):
+                status += f"\nRighe modificate dall'elaborazione precedente: {results['changed_rows']}"
+            if results.get("near_misses"):
+                status += f"\nNomi FOTO corretti automaticamente: {len(results['near_misses'])}"
+            if results.get("image_problems"):
+                status += f"\nImmagini con problemi: {len(results['image_problems'])} (vedi report_elaborazione.json)"
+            if results.get("timings"):
+                from processor import format_timings
+                status += "\n" + format_timings(results["timings"])
+            self.status_text.setText(status)
+        elif results.get("cancelled"):
+            self.progress_bar.setValue(0)
+            self.status_text.setText("Elaborazione annullata.")
         else:
             # Show error
             self.status_text.setText(f"Errore: {results.get('error', 'Errore sconosciuto')}")
             self.status_text.setStyleSheet(STATUS_TEXT_ERROR)
+
+    def closeEvent(self, event) -> None:
+        """Stop a running generation before closing the window."""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().closeEvent(event)
         
 if __name__ == "__main__":
+    # Needed by the image worker processes in frozen (bundled) builds
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon("logo.png"))  # Set the app icon for taskbar/dock
     # Force light mode colors regardless of system theme
@@ -431,4 +610,6 @@ if __name__ == "__main__":
     app.setPalette(light_palette)
     window = MainWindow()
     window.show()
+    # Load the heavy processing modules while the user picks the files
+    threading.Thread(target=warm_up_processor, daemon=True).start()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Benchmark generate_csv_output against the original row-by-row exporter.
+
+Usage:
+    python benchmarks/bench_csv.py --rows 10000 100000
+
+Both exporters write their chunks to temporary folders; the files are compared
+byte by byte, so the benchmark also checks that the output is unchanged.
+"""
+import argparse
+import filecmp
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor import (REQUIRED_COLUMNS, CSV_COLUMNS, CSV_TO_EXCEL_MAPPING,
+                       generate_csv_output)
+
+
+def legacy_generate_csv_output(df, output_path, column_mapping):
+    """The original exporter: one pd.concat and one mapping lookup per cell."""
+    # array_split on a DataFrame and concat onto an empty frame warn on recent pandas
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return _legacy_export(df, output_path, column_mapping)
+
+
+def _legacy_export(df, output_path, column_mapping):
+    csv_df = pd.DataFrame(columns=CSV_COLUMNS)
+    total_rows = len(df)
+    chunk_size = 60
+    chunk_number = (total_rows + chunk_size - 1) // chunk_size
+    csv_paths = []
+
+    split_df = np.array_split(df, chunk_number)
+
+    for j, chunk_df in enumerate(split_df):
+        for i, row in chunk_df.iterrows():
+            csv_row = {}
+            for csv_col in CSV_COLUMNS:
+                excel_col = CSV_TO_EXCEL_MAPPING.get(csv_col)
+                if excel_col:
+                    actual_col = column_mapping.get(excel_col)
+                    if actual_col in row:
+                        csv_row[csv_col] = row[actual_col]
+                    else:
+                        csv_row[csv_col] = ""
+                else:
+                    csv_row[csv_col] = ""
+            csv_df = pd.concat([csv_df, pd.DataFrame([csv_row])], ignore_index=True)
+
+        csv_path = os.path.join(output_path, f"import_campioni_{j+1}di{chunk_number}.csv")
+        csv_paths.append(csv_path)
+        csv_df.to_csv(csv_path, index=False)
+        csv_df = pd.DataFrame(columns=CSV_COLUMNS)
+
+    return csv_paths
+
+
+def make_dataframe(rows: int) -> pd.DataFrame:
+    """Build a cleaned-looking BOX dataframe with mixed text and numbers."""
+    rng = np.random.default_rng(0)
+    data = {column: [f"{column[:4]} {i}" for i in range(rows)] for column in REQUIRED_COLUMNS}
+    data["FOTO"] = [f"L{i:07d}.JPG" for i in range(rows)]
+    data["FOTO DETTAGLIO"] = [f"L{i:07d}_dettaglio.jpg" for i in range(rows)]
+    data["ALTEZZA"] = rng.integers(120, 180, rows).astype(float)
+    data["PESO"] = rng.integers(100, 600, rows).astype(float)
+    return pd.DataFrame(data)
+
+
+def time_exporter(exporter, df, column_mapping):
+    """Run one exporter in a fresh folder and return (seconds, folder)."""
+    folder = tempfile.mkdtemp(prefix="bench_csv_")
+    start = time.perf_counter()
+    exporter(df, folder, column_mapping)
+    return time.perf_counter() - start, folder
+
+
+def same_output(folder_a: str, folder_b: str) -> bool:
+    """Check that two exports produced the same files with the same content."""
+    files_a, files_b = sorted(os.listdir(folder_a)), sorted(os.listdir(folder_b))
+    if files_a != files_b:
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(folder_a, folder_b, files_a, shallow=False)
+    return not mismatch and not errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--skip-legacy-above", type=int, default=None,
+                        help="Do not run the legacy exporter above this many rows")
+    args = parser.parse_args()
+
+    column_mapping = {column: column for column in REQUIRED_COLUMNS}
+    for rows in args.rows:
+        df = make_dataframe(rows)
+        new_time, new_folder = time_exporter(
+            lambda d, o, m: generate_csv_output(d, o, m), df, column_mapping)
+        line = f"{rows:>8} rows  vectorized {new_time:8.3f}s"
+
+        if args.skip_legacy_above is None or rows <= args.skip_legacy_above:
+            old_time, old_folder = time_exporter(legacy_generate_csv_output, df, column_mapping)
+            line += f"  legacy {old_time:8.3f}s  speedup {old_time / new_time:6.1f}x"
+            line += "  output identical" if same_output(old_folder, new_folder) else "  OUTPUT DIFFERS"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
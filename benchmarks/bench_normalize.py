@@ -0,0 +1,55 @@
+"""
+Benchmark normalize_dataframe against normalize_row applied row by row.
+
+Usage:
+    python benchmarks/bench_normalize.py --rows 10000 100000
+
+The normalized values of both are compared cell by cell (value and type), so
+the benchmark also checks that the output is unchanged.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datasets import make_box_dataframe
+from processor import REQUIRED_COLUMNS, normalize_dataframe, normalize_row
+
+
+def same_cell(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (a != a and b != b)
+    return type(a) == type(b) and a == b
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    column_mapping = {column: column for column in REQUIRED_COLUMNS}
+    for rows in args.rows:
+        # As in process_files: the cleaned DataFrame with blanks filled
+        df = make_box_dataframe(rows).fillna('')
+
+        start = time.perf_counter()
+        legacy = [normalize_row(row, column_mapping).to_dict() for _, row in df.iterrows()]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorized = normalize_dataframe(df, column_mapping).to_dict("records")
+        vectorized_time = time.perf_counter() - start
+
+        identical = all(same_cell(old[column], new[column])
+                        for old, new in zip(legacy, vectorized) for column in df.columns)
+        print(f"{rows:>8} rows  vectorized {vectorized_time:8.3f}s  legacy {legacy_time:8.3f}s  "
+              f"speedup {legacy_time / vectorized_time:6.1f}x  "
+              f"{'output identical' if identical else 'OUTPUT DIFFERS'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Benchmark the header-first spreadsheet readers against reading the whole sheet.
+
+Usage:
+    python benchmarks/bench_reader.py --rows 10000 --extra-columns 0 30
+    python benchmarks/bench_reader.py --rows 10000 --numbers
+
+Compares pd.read_excel on the whole sheet (the previous reader) with
+read_excel_columns, which reads the header, matches REQUIRED_COLUMNS and
+then reads only those columns, with the engine chosen by excel_engine
+(python-calamine when installed). Reports time and peak traced memory, the
+time to reject a sheet with a missing column, and checks that the required
+columns come out identical.
+
+With --numbers the same sheet is also written as a Numbers document and
+read_numbers_columns is compared with the previous reader (a Document
+opened with numbers-parser, then one dict per row).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datasets import make_box_dataframe, write_numbers
+from processor import (REQUIRED_COLUMNS, excel_engine, load_numbers_document,
+                       read_excel_columns, read_numbers_columns)
+
+
+def measure(reader, *args):
+    """Run reader(*args); return (result, seconds, peak MiB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = reader(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024**2
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def legacy_numbers_to_dataframe(path: str) -> pd.DataFrame:
+    """The previous Numbers reader: every cell of the document, one dict per row."""
+    rows = load_numbers_document()(path).sheets[0].tables[0].rows()
+    headers = [cell.value for cell in rows[0]]
+    return pd.DataFrame([{headers[i]: cell.value for i, cell in enumerate(row)} for row in rows[1:]])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000])
+    parser.add_argument("--extra-columns", type=int, nargs="+", default=[0, 30],
+                        help="Columns not used by the app added to the sheet")
+    parser.add_argument("--numbers", action="store_true",
+                        help="Also compare the Numbers readers (needs numbers-parser)")
+    args = parser.parse_args()
+
+    print(f"engine: {excel_engine() or 'pandas default (openpyxl)'}")
+    folder = tempfile.mkdtemp(prefix="bench_reader_")
+    for rows in args.rows:
+        for extra in args.extra_columns:
+            df = make_box_dataframe(rows)
+            for n in range(extra):
+                df[f"EXTRA {n}"] = [f"nota {i} {n}" for i in range(rows)]
+            path = os.path.join(folder, f"box_{rows}_{extra}.xlsx")
+            df.to_excel(path, index=False)
+            df.drop(columns=["PESO"]).to_excel(path.replace(".xlsx", "_nopeso.xlsx"), index=False)
+
+            legacy, legacy_time, legacy_peak = measure(pd.read_excel, path)
+            (fast, _), fast_time, fast_peak = measure(read_excel_columns, path)
+            _, reject_time, _ = measure(read_excel_columns, path.replace(".xlsx", "_nopeso.xlsx"))
+
+            required = [column for column in legacy.columns if column in REQUIRED_COLUMNS]
+            identical = legacy[required].equals(fast[required])
+            print(f"{rows:>8} rows +{extra:>3} extra  "
+                  f"read_excel {legacy_time:7.2f}s {legacy_peak:7.1f} MiB  "
+                  f"header-first {fast_time:7.2f}s {fast_peak:7.1f} MiB  "
+                  f"reject {reject_time:6.2f}s  "
+                  f"{'columns identical' if identical else 'COLUMNS DIFFER'}")
+
+            numbers_path = path.replace(".xlsx", ".numbers")
+            if args.numbers and write_numbers(df, numbers_path):
+                legacy, legacy_time, legacy_peak = measure(legacy_numbers_to_dataframe, numbers_path)
+                (fast, _), fast_time, fast_peak = measure(read_numbers_columns, numbers_path)
+                identical = legacy[required].equals(fast[required])
+                print(f"{'':>8} numbers    Document   {legacy_time:7.2f}s {legacy_peak:7.1f} MiB  "
+                      f"columnar     {fast_time:7.2f}s {fast_peak:7.1f} MiB  "
+                      f"{'':>14}{'columns identical' if identical else 'COLUMNS DIFFER'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Time every processing stage on synthetic BOX datasets and save the results.
+
+    python benchmarks/bench_suite.py                      # 100, 1k and 10k rows
+    python benchmarks/bench_suite.py --scales 100 --repeat 5
+    python benchmarks/compare_results.py benchmarks/results/abc123.json benchmarks/results/def456.json
+
+Each stage runs in a fresh interpreter, so its peak RSS is its own and
+nothing is warm from a previous stage. Image stages (thumbnail, crop,
+transform) run on a sample of the photos and report the time per image;
+process_files runs end to end only up to --full-run-max rows. Datasets are
+generated once under --data-dir (see datasets.py) and reused.
+
+Results are written to benchmarks/results/<commit>.json unless --output is
+given.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+STAGES = ["parse_xlsx", "parse_numbers", "scan_images", "scan_headers", "thumbnail", "crop", "transform",
+          "csv", "process_files"]
+
+
+def peak_rss_mb(who) -> float:
+    """Peak resident set size in MiB (ru_maxrss is in KiB on Linux, bytes on macOS)."""
+    if resource is None:
+        return None
+    if who == resource.RUSAGE_SELF and os.path.isfile("/proc/self/status"):
+        # Linux carries ru_maxrss over fork and exec, so a fresh interpreter would
+        # report the peak of the benchmark driver; VmHWM starts over at exec
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024**2 if sys.platform == "darwin" else 1024), 1)
+
+
+def sample_images(dataset: dict, count: int) -> list:
+    names = sorted(os.listdir(dataset["images"]))[:count]
+    return [os.path.join(dataset["images"], name) for name in names]
+
+
+def time_images(dataset: dict, options: dict, work) -> dict:
+    """Run work(img, output_folder, filename) on the sample photos; time per image."""
+    from PIL import Image
+
+    paths = sample_images(dataset, options["image_sample"])
+    with tempfile.TemporaryDirectory(prefix="bench_img_") as folder:
+        start = time.perf_counter()
+        for path in paths:
+            with Image.open(path) as img:
+                work(img, folder, os.path.basename(path))
+        elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "images": len(paths), "per_image": elapsed / max(1, len(paths))}
+
+
+def stage_parse_xlsx(dataset, options):
+    from processor import parse_excel_file
+    start = time.perf_counter()
+    success, info, message = parse_excel_file(dataset["xlsx"])
+    return {"seconds": time.perf_counter() - start, "rows": info.get("rows_after_cleaning")}
+
+
+def stage_parse_numbers(dataset, options):
+    from processor import parse_excel_file
+    if not dataset["numbers"]:
+        return None
+    start = time.perf_counter()
+    success, info, message = parse_excel_file(dataset["numbers"])
+    return {"seconds": time.perf_counter() - start, "rows": info.get("rows_after_cleaning")}
+
+
+def stage_scan_images(dataset, options):
+    from processor import build_image_index
+    start = time.perf_counter()
+    index = build_image_index(dataset["images"])
+    return {"seconds": time.perf_counter() - start, "images": index["total_images"]}
+
+
+def stage_scan_headers(dataset, options):
+    from processor import build_image_index, scan_image_headers
+    index = build_image_index(dataset["images"])
+    start = time.perf_counter()
+    headers = scan_image_headers(dataset["images"], index)
+    return {"seconds": time.perf_counter() - start, "images": len(headers)}
+
+
+def stage_thumbnail(dataset, options):
+    from processor import create_thumbnail
+    return time_images(dataset, options, lambda img, folder, name:
+                       create_thumbnail(img, os.path.join(folder, "thumb_" + name)))
+
+
+def stage_crop(dataset, options):
+    from processor import crop_image
+    return time_images(dataset, options, lambda img, folder, name:
+                       crop_image(img, os.path.join(folder, "crop_" + name)))
+
+
+def stage_transform(dataset, options):
+    from processor import transform_image
+    return time_images(dataset, options, lambda img, folder, name:
+                       transform_image(img, os.path.join(folder, "thumb_" + name),
+                                       os.path.join(folder, "crop_" + name),
+                                       draft=options["draft"]))
+
+
+def stage_csv(dataset, options):
+    from processor import parse_excel_file, generate_csv_output
+    success, info, message = parse_excel_file(dataset["xlsx"])
+    with tempfile.TemporaryDirectory(prefix="bench_csv_") as folder:
+        start = time.perf_counter()
+        generate_csv_output(info["cleaned_df"], folder, info["column_mapping"])
+        elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "rows": len(info["cleaned_df"])}
+
+
+def stage_process_files(dataset, options):
+    from processor import process_files
+    if dataset["rows"] > options["full_run_max"]:
+        return None
+    with tempfile.TemporaryDirectory(prefix="bench_run_") as folder:
+        start = time.perf_counter()
+        success, results = process_files(dataset["xlsx"], dataset["images"], folder,
+                                         workers=options["workers"], draft_mode=options["draft"])
+        elapsed = time.perf_counter() - start
+    stats = {"seconds": elapsed, "success": success,
+             "processed_rows": results.get("processed_rows"),
+             "children_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None}
+    if "timings" in results:
+        stats["timings"] = results["timings"]
+    return stats
+
+
+def run_stage_here(stage: str, dataset: dict, options: dict) -> dict:
+    """Run one stage in this interpreter (the child side of run_stage)."""
+    with contextlib.redirect_stdout(sys.stderr):
+        result = globals()["stage_" + stage](dataset, options)
+    if result is not None:
+        result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    return result
+
+
+def run_stage(stage: str, dataset: dict, options: dict) -> dict:
+    """Run one stage in a fresh interpreter and return its measurements."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-stage", stage,
+         "--dataset-json", json.dumps(dataset), "--options-json", json.dumps(options)],
+        cwd=REPO_DIR, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def environment() -> dict:
+    """Commit and library versions, to tell result files apart."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    versions = {}
+    for module in ["pandas", "numpy", "PIL", "xlsxwriter", "openpyxl", "numbers_parser"]:
+        try:
+            versions[module] = getattr(__import__(module), "__version__", "?")
+        except ImportError:
+            versions[module] = None
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the median is kept")
+    parser.add_argument("--image-sample", type=int, default=10,
+                        help="Photos per image stage (default: 10)")
+    parser.add_argument("--full-run-max", type=int, default=1000,
+                        help="Largest scale run end to end through process_files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--draft", action="store_true", help="Use JPEG draft-mode decoding")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "genera_excel_bench"))
+    parser.add_argument("--output", default=None, help="Results file (default: results/<commit>.json)")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--dataset-json", help=argparse.SUPPRESS)
+    parser.add_argument("--options-json", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        result = run_stage_here(args.run_stage, json.loads(args.dataset_json),
+                                json.loads(args.options_json))
+        print(json.dumps(result))
+        return 0
+
+    from datasets import ensure_dataset
+
+    options = {"image_sample": args.image_sample, "full_run_max": args.full_run_max,
+               "workers": args.workers, "draft": args.draft}
+    report = {"environment": environment(), "options": options, "results": {}}
+
+    for rows in args.scales:
+        print(f"Dataset {rows} rows...", flush=True)
+        dataset = ensure_dataset(args.data_dir, rows, args.seed)
+        report["results"][str(rows)] = scale_results = {}
+        for stage in args.stages:
+            runs = [run_stage(stage, dataset, options) for _ in range(args.repeat)]
+            if runs[0] is None:
+                continue
+            result = dict(sorted(runs, key=lambda r: r["seconds"])[len(runs) // 2])  # median run
+            result["runs"] = [round(r["seconds"], 4) for r in runs]
+            result["peak_rss_mb"] = max((r["peak_rss_mb"] or 0) for r in runs) or None
+            scale_results[stage] = result
+            per_image = f"  {result['per_image'] * 1000:7.1f} ms/image" if "per_image" in result else ""
+            print(f"  {stage:<14} {result['seconds']:9.3f}s  peak {result['peak_rss_mb']} MiB{per_image}",
+                  flush=True)
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{report['environment']['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Compare two bench_suite.py result files, e.g. before and after a change:
+
+    python benchmarks/compare_results.py results/abc123.json results/def456.json
+
+Prints time and peak RSS of every stage present in both files and exits
+non-zero when a stage got slower than --threshold (default 10%).
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def describe(report: dict) -> str:
+    env = report["environment"]
+    dirty = " (modified)" if env.get("dirty") else ""
+    return f"{env.get('commit')}{dirty} {env.get('date')} python {env.get('python')}, {env.get('cpus')} CPU"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base", help="Results of the reference commit")
+    parser.add_argument("new", help="Results to compare against it")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    print(f"base: {describe(base)}")
+    print(f"new:  {describe(new)}")
+    if base.get("options") != new.get("options"):
+        print(f"warning: different options {base.get('options')} / {new.get('options')}")
+    print()
+    print(f"{'rows':>7} {'stage':<14} {'base':>10} {'new':>10} {'change':>8}   {'peak MiB':>17}")
+
+    regressions = 0
+    for rows, stages in new["results"].items():
+        for stage, result in stages.items():
+            reference = base["results"].get(rows, {}).get(stage)
+            if reference is None:
+                continue
+            # Image stages are compared per photo, in case the sample sizes differ
+            metric = "per_image" if "per_image" in result and "per_image" in reference else "seconds"
+            change = result[metric] / reference[metric] - 1 if reference[metric] else 0.0
+            flag = ""
+            if change > args.threshold:
+                flag = "  SLOWER"
+                regressions += 1
+            elif change < -args.threshold:
+                flag = "  faster"
+            memory = f"{reference.get('peak_rss_mb')} -> {result.get('peak_rss_mb')}"
+            print(f"{rows:>7} {stage:<14} {reference['seconds']:9.3f}s {result['seconds']:9.3f}s "
+                  f"{change:+8.1%}   {memory:>17}{flag}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Synthetic BOX datasets for the benchmarks.
+
+A dataset is a folder with the same BOX sheet as .xlsx and (when
+numbers-parser is installed) .numbers, plus a folder of camera-sized JPEGs
+named after the FOTO column:
+
+    box.xlsx, box.numbers, foto/L0000000.JPG, ...
+
+The sheet looks like the real ones: an extra column, FOTO values without the
+dot, blank FOTO cells, duplicated FOTO values, rows whose photo is missing,
+and ALTEZZA/PESO written as free text. Photos are rendered once into a small
+pool and hard-linked (or copied) under every FOTO name, so a 10k-row dataset
+does not need 10k encodes. Generation is deterministic for a given seed and
+a dataset already on disk is reused.
+"""
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor import REQUIRED_COLUMNS, load_numbers_document
+
+# Landscape, as shot: process_files rotates it to 3648x4864
+CAMERA_SIZE = (4864, 3648)
+
+# Share of the rows with each kind of problem
+BLANK_FOTO_RATE = 0.02
+DUPLICATE_RATE = 0.02
+MISSING_IMAGE_RATE = 0.01
+NO_DOT_RATE = 0.05
+
+MANIFEST_FILENAME = "dataset.json"
+
+
+def make_box_dataframe(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a BOX sheet with the given number of rows.
+
+    Returns:
+        DataFrame with the required columns plus an extra NOTE column
+    """
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    data = {column: [f"{column[:4].strip()} {i % 97}" for i in index] for column in REQUIRED_COLUMNS}
+    data["CODICE TAILOR"] = [f"T{i:06d}" for i in index]
+
+    foto = np.array([f"L{i:07d}.JPG" for i in index], dtype=object)
+    no_dot = rng.random(rows) < NO_DOT_RATE
+    foto[no_dot] = [name.replace(".", "") for name in foto[no_dot]]
+    duplicate = rng.random(rows) < DUPLICATE_RATE
+    duplicate[0] = False
+    foto[duplicate] = foto[np.flatnonzero(duplicate) - 1]
+    foto[rng.random(rows) < BLANK_FOTO_RATE] = None
+    data["FOTO"] = foto
+    data["FOTO DETTAGLIO"] = ""
+
+    heights = rng.integers(120, 180, rows)
+    data["ALTEZZA"] = [f"{h}/{h + 10} cm" if h % 2 else float(h) for h in heights]
+    weights = rng.integers(100, 600, rows)
+    data["PESO"] = [f"{w} gr - {w - 50}" if w % 3 == 0 else float(w) for w in weights]
+    data["NOTE"] = "synthetic"
+    return pd.DataFrame(data)
+
+
+def render_photo(seed: int, size=CAMERA_SIZE) -> Image.Image:
+    """A camera-sized photo with enough detail to cost a realistic encode/decode."""
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGB", size, tuple(int(v) for v in rng.integers(0, 255, 3)))
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    for _ in range(60):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        draw.ellipse([x, y, x + width // 6, y + height // 8], fill=color)
+    # Fine noise so JPEG sizes are closer to real photos than flat colors
+    noise = rng.integers(-12, 12, (height // 8, width // 8, 3), dtype=np.int16)
+    grain = Image.fromarray(np.clip(noise + 128, 0, 255).astype(np.uint8)).resize(size)
+    return Image.blend(img, grain, 0.15)
+
+
+def write_numbers(df: pd.DataFrame, path: str) -> bool:
+    """Write the sheet as a Numbers document; False if numbers-parser is missing."""
+    NumbersDocument = load_numbers_document()
+    if NumbersDocument is None:
+        return False
+    doc = NumbersDocument(num_rows=len(df) + 1, num_cols=len(df.columns))
+    table = doc.sheets[0].tables[0]
+    for col, name in enumerate(df.columns):
+        table.write(0, col, name)
+    for row, values in enumerate(df.itertuples(index=False), start=1):
+        for col, value in enumerate(values):
+            if value is not None and value == value:  # skip None and NaN
+                table.write(row, col, value)
+    doc.save(path)
+    return True
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def ensure_dataset(root: str, rows: int, seed: int = 0, pool_size: int = 8) -> dict:
+    """
+    Create (or reuse) the dataset of the given size under root.
+
+    Args:
+        root: Folder holding all benchmark datasets
+        rows: Number of sheet rows
+        seed: Random seed of the sheet and the photos
+        pool_size: Number of distinct photos rendered
+
+    Returns:
+        Dictionary with the paths (xlsx, numbers or None, images) and the
+        dataset parameters
+    """
+    folder = os.path.join(root, f"box_{rows}_s{seed}")
+    manifest_path = os.path.join(folder, MANIFEST_FILENAME)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    shutil.rmtree(folder, ignore_errors=True)
+    images = os.path.join(folder, "foto")
+    pool = os.path.join(root, f"pool_s{seed}")
+    os.makedirs(images)
+    os.makedirs(pool, exist_ok=True)
+
+    df = make_box_dataframe(rows, seed)
+    xlsx_path = os.path.join(folder, "box.xlsx")
+    df.to_excel(xlsx_path, index=False)
+    numbers_path = os.path.join(folder, "box.numbers")
+    if not write_numbers(df, numbers_path):
+        numbers_path = None
+
+    pool_paths = []
+    for n in range(pool_size):
+        path = os.path.join(pool, f"photo_{n}.JPG")
+        if not os.path.isfile(path):
+            render_photo(seed * 1000 + n).save(path, quality=92)
+        pool_paths.append(path)
+
+    # One file per distinct FOTO, named as the camera does, some left missing
+    rng = np.random.default_rng(seed + 1)
+    names = sorted({f"L{i:07d}.JPG" for i in range(rows)})
+    for n, name in enumerate(names):
+        if rng.random() >= MISSING_IMAGE_RATE:
+            link_or_copy(pool_paths[n % pool_size], os.path.join(images, name))
+
+    dataset = {
+        "rows": rows,
+        "seed": seed,
+        "xlsx": xlsx_path,
+        "numbers": numbers_path,
+        "images": images,
+        "image_count": len(os.listdir(images)),
+        "camera_size": list(CAMERA_SIZE),
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(dataset, f, indent=1)
+    return dataset
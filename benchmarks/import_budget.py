@@ -0,0 +1,83 @@
+"""
+Guard the startup cost of the application modules.
+
+Each module is imported in a fresh interpreter; the script checks which heavy
+modules got loaded as a side effect and how long the import took (median of
+several runs), and exits non-zero when a budget is exceeded:
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --scale 2   # slower machine
+
+The GUI module is skipped when PyQt5 is not installed.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pandas", "numpy", "PIL", "xlsxwriter", "numbers_parser", "PyQt5"]
+
+# module -> (seconds, heavy modules it may load)
+BUDGETS = {
+    "app": (0.35, ["PyQt5"]),
+    "cli": (0.10, []),
+    "processor": (1.00, ["pandas", "numpy", "PIL", "xlsxwriter"]),
+}
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed,
+                   "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int):
+    """Import module in fresh interpreters; return (median seconds, heavy modules loaded)."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    timings, loaded = [], []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return statistics.median(timings), loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every time budget (for slower machines)")
+    args = parser.parse_args()
+
+    failures = 0
+    for module, (budget, allowed) in BUDGETS.items():
+        if module == "app" and importlib.util.find_spec("PyQt5") is None:
+            print(f"{module:<10} skipped (PyQt5 not installed)")
+            continue
+
+        seconds, loaded = measure(module, args.runs)
+        budget *= args.scale
+        unexpected = [m for m in loaded if m not in allowed]
+        ok = seconds <= budget and not unexpected
+        failures += not ok
+        line = f"{module:<10} {seconds:6.3f}s (budget {budget:.2f}s)"
+        if unexpected:
+            line += f"  unexpected imports: {', '.join(unexpected)}"
+        print(f"{line}  {'ok' if ok else 'FAIL'}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Headless command-line entry point for process_files.
+
+Runs one or more (excel, images folder, output) jobs without the GUI, e.g. for
+nightly runs over many BOX folders on a server with no display:
+
+    python cli.py BOX12.xlsx BOX12/foto out/BOX12
+    python cli.py --manifest jobs.json --jobs 2 --json
+
+A manifest is either a JSON list of {"excel", "images", "output"} objects or a
+CSV file with excel,images,output columns; relative paths are resolved from the
+manifest's folder. The exit code is 0 when every job succeeds, 1 when at least
+one job fails and 2 for usage errors.
+
+PyQt5 is never imported here.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+# Seconds between two progress lines of the same job
+PROGRESS_INTERVAL = 1.0
+
+
+def load_manifest(manifest_path: str) -> List[Dict[str, str]]:
+    """
+    Read the jobs of a JSON or CSV manifest.
+
+    Args:
+        manifest_path: Path to the manifest file
+
+    Returns:
+        List of jobs, each a dictionary with excel, images and output paths
+
+    Raises:
+        ValueError: If the manifest is not a list of jobs with the three paths
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, newline="", encoding="utf-8") as f:
+        if manifest_path.lower().endswith(".csv"):
+            entries = list(csv.DictReader(f))
+        else:
+            entries = json.load(f)
+
+    if not isinstance(entries, list):
+        raise ValueError(f"{manifest_path}: expected a list of jobs")
+    jobs = []
+    for n, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Job {n} of {manifest_path}: expected an object with excel, images and output")
+        missing = [key for key in ("excel", "images", "output")
+                   if not entry.get(key) or not isinstance(entry[key], str)]
+        if missing:
+            raise ValueError(f"Job {n} of {manifest_path}: missing {', '.join(missing)}")
+        jobs.append({key: os.path.join(base_dir, entry[key]) for key in ("excel", "images", "output")})
+    return jobs
+
+
+def parse_variant(text: str) -> Dict[str, Any]:
+    """Parse a --variant value, NAME:SIZE[:FORMAT[:QUALITY]] (e.g. 400w:400:webp:75)."""
+    parts = text.split(":")
+    if not 2 <= len(parts) <= 4:
+        raise argparse.ArgumentTypeError(f"expected NAME:SIZE[:FORMAT[:QUALITY]], got '{text}'")
+    try:
+        variant = {"name": parts[0], "size": int(parts[1])}
+        if len(parts) > 2:
+            variant["format"] = parts[2]
+        if len(parts) > 3:
+            variant["quality"] = int(parts[3])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"SIZE and QUALITY must be numbers in '{text}'")
+    return variant
+
+
+class Reporter:
+    """Writes job progress to a stream, as text or as JSON lines, from many threads."""
+
+    def __init__(self, stream, json_lines: bool) -> None:
+        self.stream = stream
+        self.json_lines = json_lines
+        self.lock = threading.Lock()
+
+    def emit(self, event: str, job: int, text: str, **fields: Any) -> None:
+        with self.lock:
+            if self.json_lines:
+                line = json.dumps({"event": event, "job": job, **fields}, default=str)
+            else:
+                line = f"[job {job}] {text}"
+            print(line, file=self.stream, flush=True)
+
+    def callbacks(self, job: int):
+        """Progress and status callbacks for process_files, throttled per job."""
+        last_progress = [0.0]
+
+        def progress(current: int, total: int) -> None:
+            now = time.monotonic()
+            if current == total or now - last_progress[0] >= PROGRESS_INTERVAL:
+                last_progress[0] = now
+                self.emit("progress", job, f"{current}/{total}", current=current, total=total)
+
+        def status(message: str) -> None:
+            self.emit("status", job, message, message=message)
+
+        return progress, status
+
+
+def run_job(number: int, job: Dict[str, str], options: Dict[str, Any], reporter: Reporter) -> bool:
+    """Validate the inputs of one job like the GUI does, run it and report its outcome."""
+    from processor import check_excel_file, check_image_folder, process_files
+
+    reporter.emit("start", number, f"{job['excel']} -> {job['output']}", **job)
+    progress, status = reporter.callbacks(number)
+    start = time.perf_counter()
+
+    excel_valid, excel_message = check_excel_file(job["excel"])
+    # Only list the folder: process_files checks the headers of the photos it uses
+    folder_valid, _, folder_message = check_image_folder(job["images"], scan_headers=False)
+    if not excel_valid:
+        success, results = False, {"error": f"{job['excel']}: {excel_message}"}
+    elif not folder_valid:
+        success, results = False, {"error": f"{job['images']}: {folder_message}"}
+    else:
+        try:
+            success, results = process_files(job["excel"], job["images"], job["output"],
+                                             progress, status, **options)
+        except Exception as e:  # process_files reports its own errors; this is a last resort
+            success, results = False, {"error": str(e)}
+        # The website import CSVs are part of the job: without them it failed
+        if success and not results.get("csv_success", False):
+            success = False
+            results["error"] = f"CSV non generati: {results.get('csv_error') or 'Errore sconosciuto'}"
+    elapsed = time.perf_counter() - start
+
+    if success:
+        text = (f"completato in {elapsed:.1f}s: {results.get('processed_rows', 0)} righe, "
+                f"{results.get('missing_images', 0)} immagini mancanti")
+        if results.get("timings"):
+            from processor import format_timings
+            text += f"\n[job {number}] {format_timings(results['timings'])}"
+    else:
+        text = f"errore: {results.get('error', 'Errore sconosciuto')}"
+    reporter.emit("done", number, text, success=success, seconds=round(elapsed, 3), results=results)
+    return success
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Genera Excel anteprime, crop e CSV senza interfaccia grafica.")
+    parser.add_argument("job", nargs="*", metavar="PATH",
+                        help="EXCEL IMAGES_FOLDER OUTPUT_FOLDER of a single job")
+    parser.add_argument("--manifest", action="append", default=[],
+                        help="JSON or CSV file listing jobs (can be repeated)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of jobs to run at the same time (default: 1)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Image worker processes per job (default: CPUs / jobs)")
+    parser.add_argument("--json", action="store_true", help="Write progress as JSON lines")
+    parser.add_argument("--draft", action="store_true", help="Use JPEG draft-mode decoding")
+    parser.add_argument("--cache-dir", default=None, help="Persistent thumbnail/crop cache folder")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Write the workbook in constant-memory mode")
+    parser.add_argument("--thumbnails-in-memory", action="store_true",
+                        help="Embed thumbnails from memory instead of temporary files")
+    parser.add_argument("--resume", action="store_true",
+                        help="Journal finished rows and resume an interrupted job")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep the journal after the job, so a rerun only processes "
+                             "new or changed photos")
+    parser.add_argument("--read-ahead-mb", type=int, default=0,
+                        help="Read upcoming photos into memory, up to this many MB "
+                             "(for photos on network shares; default: off)")
+    parser.add_argument("--variant", type=parse_variant, action="append", default=[],
+                        metavar="NAME:SIZE[:FORMAT[:QUALITY]]",
+                        help="Extra website crop, e.g. 400w:400:webp:75 (can be repeated)")
+    parser.add_argument("--detail-variant", default=None, metavar="NAME",
+                        help="Variant written in FOTO DETTAGLIO instead of <foto>_dettaglio.jpg")
+    parser.add_argument("--profile", action="store_true",
+                        help="Save cProfile statistics to profile.prof in each output folder")
+    parser.add_argument("--csv-chunk-size", type=int, default=60,
+                        help="Maximum rows per website import CSV (default: 60)")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.job and len(args.job) != 3:
+        parser.error("a single job needs exactly EXCEL IMAGES_FOLDER OUTPUT_FOLDER")
+    if args.jobs < 1 or (args.workers is not None and args.workers < 1):
+        parser.error("--jobs and --workers must be at least 1")
+    if args.csv_chunk_size < 1:
+        parser.error("--csv-chunk-size must be at least 1")
+    if args.detail_variant and args.detail_variant not in (v["name"] for v in args.variant):
+        parser.error(f"--detail-variant {args.detail_variant}: no --variant with that name")
+
+    jobs = []
+    if args.job:
+        jobs.append(dict(zip(("excel", "images", "output"), args.job)))
+    try:
+        for manifest in args.manifest:
+            jobs.extend(load_manifest(manifest))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not jobs:
+        parser.error("no jobs: give EXCEL IMAGES_FOLDER OUTPUT_FOLDER or --manifest")
+
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.jobs)
+    options = {
+        "workers": workers,
+        "draft_mode": args.draft,
+        "cache_dir": args.cache_dir,
+        "streaming": args.streaming,
+        "thumbnails_in_memory": args.thumbnails_in_memory,
+        "csv_chunk_size": args.csv_chunk_size,
+        "resume": args.resume,
+        "incremental": args.incremental,
+        "profile": args.profile,
+        "read_ahead_bytes": args.read_ahead_mb * 1024**2,
+        "crop_variants": args.variant,
+        "detail_variant": args.detail_variant,
+    }
+
+    # Only the reporter writes to stdout; diagnostics printed by the
+    # processing code go to stderr so JSON lines stay parseable
+    reporter = Reporter(sys.stdout, args.json)
+    with contextlib.redirect_stdout(sys.stderr):
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            outcomes = list(executor.map(lambda item: run_job(item[0], item[1], options, reporter),
+                                         enumerate(jobs, start=1)))
+
+    failed = outcomes.count(False)
+    if not args.json:
+        print(f"{len(jobs) - failed}/{len(jobs)} job completati")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,16 @@
-from typing import Tuple, Dict, Any, List
-import os, os.path, re
+from typing import Tuple, Dict, Any, List, Optional, Union
+import os, os.path, re, math, json, hashlib, shutil, time, io, threading, contextlib, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import xlsxwriter
 from PIL import Image
 
-from numbers_parser import Document as NumbersDocument
+# numbers-parser is heavy and only needed for .numbers files: see load_numbers_document
+
+class ProcessingCancelled(Exception):
+    """Raised inside process_files when the caller asks to stop."""
 
 # List of required columns for our specific Excel format
 REQUIRED_COLUMNS = [
@@ -15,6 +20,99 @@ REQUIRED_COLUMNS = [
     "MOTIVO", "SOSTENIBILITA'", "CERTIFICAZIONE"
 ]
 
+# Supported image file extensions
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
+
+# Columns of the website import CSV, in the exact order required
+CSV_COLUMNS = [
+    "tax:casse", "tax:categorie", "cf:foto", "cf:foto_dettaglio", "tax:composizioni",
+    "cf:codice", "cf:fornitore", "cf:art_fornitore", "cf:unita_di_misura", "cf:altezza",
+    "cf:peso", "tax:armature", "tax:lavorazioni", "tax:descrizioni", "tax:motivi",
+    "tax:sostenibili", "cf:certificazione"
+]
+
+# Mapping from CSV columns to Excel columns
+CSV_TO_EXCEL_MAPPING = {
+    "tax:casse": "POSIZIONE",
+    "tax:categorie": "CATEGORIA",
+    "cf:foto": "FOTO",
+    "cf:foto_dettaglio": "FOTO DETTAGLIO",
+    "tax:composizioni": "COMPOSIZIONE",
+    "cf:codice": "CODICE TAILOR",
+    "cf:fornitore": "FORNITORE",
+    "cf:art_fornitore": "ART. FORNITORE",
+    "cf:unita_di_misura": "UNITA' DI MISURA",
+    "cf:altezza": "ALTEZZA",
+    "cf:peso": "PESO",
+    "tax:armature": "ARMATURA",
+    "tax:lavorazioni": "LAVORAZIONE",
+    "tax:descrizioni": "DESCRIZIONE",
+    "tax:motivi": "MOTIVO",
+    "tax:sostenibili": "SOSTENIBILITA'",
+    "cf:certificazione": "CERTIFICAZIONE"
+}
+
+# Website crop geometry, in pixels of the rotated camera image (3648x4864)
+CROP_WIDTH = 3648/2-300
+CROP_HEIGHT = 4864/2-300
+CROP_DOWNSHIFT = -200
+
+# Output sizes and JPEG qualities of the Excel thumbnail and the website crop
+THUMB_SIZE = (500, 500)
+THUMB_QUALITY = 70
+CROP_SIZE = (1000, 1000)
+CROP_QUALITY = 80
+
+# File extension of each format available for the extra crop variants
+VARIANT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+def normalize_crop_variants(variants: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Validate the extra website crop variants and fill in their defaults.
+    
+    Args:
+        variants: List of dictionaries with "name" (used in the file name),
+            "size" (maximum side, or [width, height]) and optionally
+            "format" (JPEG, WEBP or PNG; default JPEG) and "quality"
+            (default CROP_QUALITY)
+        
+    Returns:
+        List of dictionaries with name, size [width, height], format and quality
+        
+    Raises:
+        ValueError: If a variant is not valid (the message is for the user)
+    """
+    normalized = []
+    for variant in variants or []:
+        name = str(variant.get("name", ""))
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", name) or name in (v["name"] for v in normalized):
+            raise ValueError(f"Nome della variante non valido o ripetuto: '{name}'")
+        size = variant.get("size")
+        size = [size, size] if isinstance(size, int) else list(size or [])
+        if len(size) != 2 or min(size) < 1:
+            raise ValueError(f"Dimensione della variante '{name}' non valida: {variant.get('size')}")
+        image_format = str(variant.get("format", "JPEG")).upper().replace("JPG", "JPEG")
+        if image_format not in VARIANT_EXTENSIONS:
+            raise ValueError(f"Formato della variante '{name}' non supportato: {image_format}")
+        if image_format == "WEBP":
+            from PIL import features
+            if not features.check("webp"):
+                raise ValueError("Questa installazione di Pillow non supporta il formato WebP")
+        normalized.append({"name": name, "size": [int(size[0]), int(size[1])],
+                           "format": image_format,
+                           "quality": int(variant.get("quality", CROP_QUALITY))})
+    return normalized
+
+def variant_filename(base_name: str, variant: Dict[str, Any]) -> str:
+    """File name of a crop variant, next to the default <base>_dettaglio.jpg."""
+    return f"{base_name}_dettaglio_{variant['name']}{VARIANT_EXTENSIONS[variant['format']]}"
+
+# Image extensions recognized in FOTO values, without the dot
+FOTO_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff'}
+
+# Extension written without the dot at the end of a (lowercased) FOTO value
+EMBEDDED_EXTENSION_PATTERN = re.compile(r'(.+?)(jpe?g|png|gif|bmp|tiff)$')
+
 def normalize_image_filename(filename: str) -> str:
     """
     Verifica e normalizza il nome di un file immagine, correggendo piccoli errori.
@@ -29,23 +127,17 @@ def normalize_image_filename(filename: str) -> str:
         >>> normalize_image_filename("L1170719.JPG")
         'L1170719.JPG'
         >>> normalize_image_filename("L1170719JPG")
-        'L1170719.JPG'
+        'l1170719.JPG'
         >>> normalize_image_filename("L1170719jpg")
-        'L1170719.jpg'
+        'l1170719.JPG'
         >>> normalize_image_filename("L1170719")
         'L1170719.JPG'
     """
-    import re
-    import os.path
-    
-    # Lista delle estensioni immagine supportate
-    supported_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff']
-    
     # Se il filename è vuoto o None, restituisci stringa vuota
     if not filename:
         return ""
     
-    # Normalizza al minuscolo per semplificare l'analisi
+    # Rimuovi gli spazi iniziali e finali
     filename = filename.strip()
     
     # Controllo se ha già un'estensione corretta
@@ -55,15 +147,14 @@ def normalize_image_filename(filename: str) -> str:
     if ext and ext.startswith('.'):
         # Rimuovi il punto e normalizza
         ext_clean = ext[1:].lower()
-        if ext_clean in supported_extensions:
+        if ext_clean in FOTO_EXTENSIONS:
             # L'estensione è già corretta, la normalizziamo
             return f"{base}.{ext_clean.upper()}"
     
     # Se siamo qui, l'estensione è mancante o non ha il punto
     
-    # Pattern per trovare estensioni incorporate nel nome senza punto
-    pattern = r'(.+?)(jpe?g|png|gif|bmp|tiff)$'
-    match = re.match(pattern, filename.lower())
+    # Cerca un'estensione incorporata nel nome senza punto
+    match = EMBEDDED_EXTENSION_PATTERN.match(filename.lower())
     
     if match:
         # Abbiamo trovato un'estensione incorporata, estraiamola
@@ -79,6 +170,67 @@ def normalize_image_filename(filename: str) -> str:
     # Se non troviamo un'estensione, assumiamo JPG come default
     return f"{filename}.JPG"
 
+def describe_near_miss(foto: str, filename: str) -> str:
+    """
+    Explain how a FOTO value differs from the image file it was matched to.
+    
+    Args:
+        foto: FOTO value as written in the sheet
+        filename: Actual filename in the image folder
+        
+    Returns:
+        Comma separated list of the corrections (in Italian, for the user)
+    """
+    reasons = []
+    name = foto.strip()
+    if name != foto:
+        reasons.append("spazi nel nome")
+    if os.path.splitext(name)[1][1:].lower() not in FOTO_EXTENSIONS:
+        if EMBEDDED_EXTENSION_PATTERN.match(name.lower()):
+            reasons.append("punto mancante prima dell'estensione")
+        else:
+            reasons.append("estensione mancante")
+    elif name != filename:
+        reasons.append("maiuscole/minuscole diverse")
+    return ", ".join(reasons)
+
+def resolve_image_files(values: pd.Series, index: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Find the image file of every FOTO value in one pass, before any image
+    work. Each distinct value is normalized and looked up in the folder index
+    once, and the results are spread back over the rows.
+    
+    Args:
+        values: FOTO values of the cleaned sheet
+        index: Image index from get_image_index
+        
+    Returns:
+        Dictionary with:
+            - "image_paths": normalized filename of every row ("" when empty)
+            - "files": actual filename of every row, or None when not found
+            - "near_misses": one dictionary per FOTO value found only after
+              correcting it, with the value, the file and the corrections
+            - "missing": normalized filename of every row without an image
+              ("(Vuoto)" for empty values), in row order
+    """
+    text = values.astype(object).where(values.notna(), "").astype(str)
+    codes, distinct = pd.factorize(text)
+    
+    normalized = [normalize_image_filename(value) for value in distinct]
+    files = [lookup_image(index, name) if name else None for name in normalized]
+    
+    near_misses = [{"foto": value, "file": filename, "reason": describe_near_miss(value, filename)}
+                   for value, filename in zip(distinct, files) if filename is not None and filename != value]
+    
+    image_paths = np.array(normalized, dtype=object)[codes].tolist()
+    row_files = np.array(files, dtype=object)[codes].tolist()
+    return {
+        "image_paths": image_paths,
+        "files": row_files,
+        "near_misses": near_misses,
+        "missing": [name or "(Vuoto)" for name, filename in zip(image_paths, row_files) if filename is None],
+    }
+
 def normalize_column_name(column: str) -> str:
     """
     Normalize a column name for fuzzy matching.
@@ -95,6 +247,63 @@ def normalize_column_name(column: str) -> str:
     normalized = re.sub(r'[^a-z0-9]', '', normalized)
     return normalized
 
+class ColumnMatcher:
+    """
+    The header row of a sheet, normalized once, matching required column
+    names against it.
+    
+    A required name matches, in order of preference: the same name, the
+    same name ignoring case, the same normalized name (see
+    normalize_column_name), or a normalized name containing or contained in
+    it and at least 70% as long. Within each kind the best candidate wins
+    (the closest length for containment), and the leftmost on ties.
+    """
+    
+    def __init__(self, column_names: List[Any]):
+        """
+        Args:
+            column_names: Column names of the sheet, in order
+        """
+        self.column_names = list(column_names)
+        self._names = set()
+        self._lower = {}
+        self._normalized = {}
+        self._candidates = []
+        for name in self.column_names:
+            text = name if isinstance(name, str) else str(name)
+            normalized = normalize_column_name(text)
+            self._names.add(name)
+            self._lower.setdefault(text.lower(), name)
+            self._normalized.setdefault(normalized, name)
+            self._candidates.append((name, normalized))
+    
+    def match(self, column: str) -> Optional[Any]:
+        """
+        Find the column of the sheet for a required column name.
+        
+        Args:
+            column: Required column name
+            
+        Returns:
+            The best matching column name of the sheet, or None if no match found
+        """
+        if column in self._names:
+            return column
+        if column.lower() in self._lower:
+            return self._lower[column.lower()]
+        
+        normalized = normalize_column_name(column)
+        if normalized in self._normalized:
+            return self._normalized[normalized]
+        
+        best, best_ratio = None, 0.0
+        for name, candidate in self._candidates:
+            if candidate and ((normalized in candidate) or (candidate in normalized)):
+                ratio = min(len(normalized), len(candidate)) / max(len(normalized), len(candidate))
+                if ratio >= 0.7 and ratio > best_ratio:
+                    best, best_ratio = name, ratio
+        return best
+
 def match_column_name(column: str, df_columns: List[str]) -> str:
     """
     Try to match a required column name with the actual columns in the dataframe.
@@ -106,77 +315,236 @@ def match_column_name(column: str, df_columns: List[str]) -> str:
     Returns:
         The matched column name from df_columns, or None if no match found
     """
-    # First try exact match
-    if column in df_columns:
-        return column
-    
-    # Try case-insensitive match
-    for df_col in df_columns:
-        if column.lower() == df_col.lower():
-            return df_col
-    
-    # Try fuzzy match
-    normalized_req = normalize_column_name(column)
-    for df_col in df_columns:
-        normalized_df = normalize_column_name(df_col)
-        
-        # Check if normalized strings are very similar
-        if normalized_req == normalized_df:
-            return df_col
-        
-        # Check if one is contained in the other
-        if (normalized_req in normalized_df) or (normalized_df in normalized_req):
-            # Additional check: they should be at least 70% similar in length
-            min_len = min(len(normalized_req), len(normalized_df))
-            max_len = max(len(normalized_req), len(normalized_df))
-            if min_len / max_len >= 0.7:
-                return df_col
-    
-    # No match found
-    return None
+    return ColumnMatcher(df_columns).match(column)
 
-def numbers_to_dataframe(file_path: str) -> pd.DataFrame:
+# Column mappings resolved in this session: (header, required names) -> mapping
+_column_mapping_cache: Dict[Tuple[tuple, tuple], Dict[str, Any]] = {}
+_column_mapping_lock = threading.Lock()
+COLUMN_MAPPING_CACHE_SIZE = 32
+
+def resolve_columns(column_names: List[Any], required: List[str] = None) -> Dict[str, Any]:
     """
-    Convert a Numbers file to a pandas DataFrame using numbers-parser.
+    Match all required columns against a header row in one pass.
+    
+    Mappings are cached by the exact header, so sheets made from the same
+    template skip matching entirely.
     
     Args:
-        file_path: Path to the Numbers file
+        column_names: Column names of the sheet, in order
+        required: Required column names (REQUIRED_COLUMNS by default)
         
     Returns:
-        DataFrame containing the data from the Numbers file
+        Dictionary mapping every required column name to the matched column
+        name, or None when the sheet has no match
+    """
+    required = REQUIRED_COLUMNS if required is None else required
+    key = (tuple(column_names), tuple(required))
+    with _column_mapping_lock:
+        mapping = _column_mapping_cache.get(key)
+    if mapping is None:
+        matcher = ColumnMatcher(column_names)
+        mapping = {column: matcher.match(column) for column in required}
+        with _column_mapping_lock:
+            _column_mapping_cache[key] = mapping
+            while len(_column_mapping_cache) > COLUMN_MAPPING_CACHE_SIZE:
+                del _column_mapping_cache[next(iter(_column_mapping_cache))]
+    return dict(mapping)
+
+def load_numbers_document():
+    """
+    Import numbers-parser on first use.
+    
+    Returns:
+        The numbers_parser.Document class, or None if the library is not installed
+    """
+    try:
+        from numbers_parser import Document
+    except ImportError:
+        return None
+    return Document
+
+# numbers-parser releases whose internal model NumbersTable reads directly
+# (from the first, inclusive, to the second, exclusive)
+NUMBERS_PARSER_INTERNALS = ((4, 20), (5, 0))
+
+def numbers_parser_internals_supported() -> bool:
+    """True when the installed numbers-parser is a release NumbersTable was tested with."""
+    try:
+        import numbers_parser
+        version = tuple(int(part) for part in numbers_parser.__version__.split(".")[:2])
+    except (ImportError, AttributeError, ValueError):
+        return False
+    return NUMBERS_PARSER_INTERNALS[0] <= version < NUMBERS_PARSER_INTERNALS[1]
+
+class NumbersTableNotFound(IndexError):
+    """The sheet or table asked for is not in the Numbers file."""
+
+class NumbersTable:
     """
-    if NumbersDocument is None:
-        raise ImportError("numbers-parser library is not installed. Please install with: pip install numbers-parser")
+    One table of a Numbers file, with its cells decoded on request.
+    
+    numbers-parser's Document decodes every cell of every table of every
+    sheet when the file is opened. With a tested numbers-parser release
+    (NUMBERS_PARSER_INTERNALS) only the selected table is located and only
+    the cells asked for are decoded, through the library's internal model;
+    otherwise, or with internals=False, the public Document API is used.
+    """
+    
+    def __init__(self, file_path: str, sheet=0, table=0, internals: bool = True):
+        """
+        Open a table of a Numbers file.
+        
+        Args:
+            file_path: Path to the Numbers file
+            sheet: Sheet position or name
+            table: Table position within the sheet, or name
+            internals: Use numbers-parser's internal model when supported
+        """
+        NumbersDocument = load_numbers_document()
+        if NumbersDocument is None:
+            raise ImportError("numbers-parser library is not installed. Please install with: pip install numbers-parser")
+        
+        model = None
+        if internals and numbers_parser_internals_supported():
+            try:
+                from pathlib import Path
+                from numbers_parser.cell import Cell
+                from numbers_parser.model import _NumbersModel
+                model = _NumbersModel(Path(file_path), None)
+                model.storage_buffers, model.merge_cells
+            except (ImportError, AttributeError, TypeError):
+                model = None
+        
+        if model is None:
+            # Public API: every table is decoded while opening the document
+            self._model = None
+            self._table = NumbersDocument(file_path).sheets[sheet].tables[table]
+            self.num_rows = self._table.num_rows
+            self.num_cols = self._table.num_cols
+            return
+        
+        sheet_ids = model.sheet_ids()
+        sheet_id = self._select(sheet_ids, [model.sheet_name(i) for i in sheet_ids], sheet, "Foglio")
+        table_ids = model.table_ids(sheet_id)
+        self._table_id = self._select(table_ids, [model.table_name(i) for i in table_ids], table, "Tabella")
+        self._model = model
+        self._cell_class = Cell
+        self._merge_cells = model.merge_cells(self._table_id)
+        self.num_rows = model.number_of_rows(self._table_id)
+        self.num_cols = model.number_of_columns(self._table_id)
     
-    # Open the Numbers document
-    doc = NumbersDocument(file_path)
+    @property
+    def uses_internals(self) -> bool:
+        """True when the cells are decoded through numbers-parser's internal model."""
+        return self._model is not None
     
-    # Use the first sheet and first table by default
-    sheet = doc.sheets[0]
-    table = sheet.tables[0]
+    @staticmethod
+    def _select(ids: List[int], names: List[str], key, kind: str) -> int:
+        """Identifier of the sheet or table given by position or name."""
+        if isinstance(key, str):
+            if key in names:
+                return ids[names.index(key)]
+        elif -len(ids) <= key < len(ids):
+            return ids[key]
+        raise NumbersTableNotFound(f"{kind} {key!r} non presente nel file")
     
-    # Get rows data - this returns a list of lists with cell objects
-    rows_data = table.rows()
+    def _decode(self, row: int, col: int, buffer) -> Any:
+        if buffer is None or self._merge_cells.is_merge_reference((row, col)):
+            return None
+        return self._cell_class._from_storage(self._table_id, row, col, buffer, self._model).value
     
-    if len(rows_data) == 0:
-        return pd.DataFrame()
+    def row(self, row: int) -> List[Any]:
+        """Values of one row (None for empty and merged cells)."""
+        if self._model is None:
+            return list(next(self._table.iter_rows(min_row=row, max_row=row, values_only=True)))
+        buffers = self._model.storage_buffers(self._table_id).get(row) or []
+        return [self._decode(row, col, buffers[col] if col < len(buffers) else None)
+                for col in range(self.num_cols)]
     
-    # Extract headers from the first row
-    headers = [cell.value if hasattr(cell, 'value') else f"Column_{i}" 
-               for i, cell in enumerate(rows_data[0])]
+    def column(self, col: int, first_row: int = 1) -> List[Any]:
+        """
+        Values of one column from first_row down (None for empty and merged
+        cells), decoding only the cells that hold data.
+        """
+        if self._model is None:
+            if first_row >= self.num_rows:
+                return []
+            return list(next(self._table.iter_cols(min_col=col, max_col=col, min_row=first_row,
+                                                   values_only=True)))
+        values = [None] * max(0, self.num_rows - first_row)
+        for row, buffers in self._model.storage_buffers(self._table_id).items():
+            if first_row <= row < self.num_rows and col < len(buffers):
+                values[row - first_row] = self._decode(row, col, buffers[col])
+        return values
+
+def _read_numbers_table(numbers_table: NumbersTable,
+                        all_columns: bool) -> Tuple[pd.DataFrame, List[str]]:
+    """Header row, then the required (or all) columns of an open NumbersTable."""
+    if numbers_table.num_rows == 0:
+        return pd.DataFrame(), []
+    
+    # A repeated header is one column, at its first position, holding the
+    # values of its last occurrence (as a DataFrame built from row dicts)
+    positions = {}
+    for col, name in enumerate(numbers_table.row(0)):
+        positions[name] = col
+    column_names = list(positions)
+    
+    if not all_columns:
+        matched = list(resolve_columns(column_names).values())
+        if None in matched:
+            return pd.DataFrame(columns=column_names), column_names
+        positions = {name: col for name, col in positions.items() if name in matched}
+    
+    df = pd.DataFrame({name: numbers_table.column(col) for name, col in positions.items()})
+    return df, column_names
+
+def read_numbers_columns(file_path: str, sheet=0, table=0,
+                         all_columns: bool = False) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Read a table of a Numbers file column by column: the header row first,
+    then only the columns that match REQUIRED_COLUMNS.
     
-    # Extract data rows (skipping header row)
-    data = []
-    for row in rows_data[1:]:
-        row_data = {}
-        for i, cell in enumerate(row):
-            if i < len(headers):  # Ensure we don't go out of bounds with headers
-                column_name = headers[i]
-                row_data[column_name] = cell.value if hasattr(cell, 'value') else None
-        data.append(row_data)
+    If anything fails while the table is read through numbers-parser's
+    internal model, the table is read again with the public API.
+    
+    Args:
+        file_path: Path to the Numbers file
+        sheet: Sheet position or name
+        table: Table position within the sheet, or name
+        all_columns: Read every column instead of the required ones only
+        
+    Returns:
+        Tuple containing:
+            - DataFrame with the columns read, named as in the file (only the
+              header when a required column is missing)
+            - All column names of the table
+    """
+    numbers_table = None
+    try:
+        numbers_table = NumbersTable(file_path, sheet, table)
+        return _read_numbers_table(numbers_table, all_columns)
+    except NumbersTableNotFound:
+        raise
+    except Exception:
+        if numbers_table is not None and not numbers_table.uses_internals:
+            raise
+    return _read_numbers_table(NumbersTable(file_path, sheet, table, internals=False), all_columns)
+
+def numbers_to_dataframe(file_path: str, sheet=0, table=0) -> pd.DataFrame:
+    """
+    Convert a Numbers file to a pandas DataFrame using numbers-parser.
     
-    # Create DataFrame
-    return pd.DataFrame(data)
+    Args:
+        file_path: Path to the Numbers file
+        sheet: Sheet position or name (the first sheet by default)
+        table: Table position within the sheet, or name (the first table by default)
+        
+    Returns:
+        DataFrame containing all the data of the table, with the first row as header
+    """
+    df, _ = read_numbers_columns(file_path, sheet, table, all_columns=True)
+    return df
 
 def check_excel_file(file_path: str) -> Tuple[bool, str]:
     """
@@ -204,7 +572,98 @@ def check_excel_file(file_path: str) -> Tuple[bool, str]:
     # If we get here, basic checks passed
     return True, "File valido"
 
-def parse_excel_file(file_path: str) -> Tuple[bool, Dict[str, Any], str]:
+def excel_engine() -> Optional[str]:
+    """
+    Pick the pandas engine for .xlsx/.xls files.
+    
+    Returns:
+        "calamine" when python-calamine is installed (Rust-backed, much
+        faster on large sheets; needs pandas 2.2+), otherwise None for the
+        pandas default (openpyxl in read-only mode, xlrd for .xls)
+    """
+    import importlib.util
+    pandas_version = tuple(int(part) for part in re.findall(r"\d+", pd.__version__)[:2])
+    if pandas_version >= (2, 2) and importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return None
+
+def read_excel_columns(file_path: str, sheet=0) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Read an Excel file header first, then only the columns that match
+    REQUIRED_COLUMNS, so extra columns are never turned into a DataFrame.
+    
+    Args:
+        file_path: Path to the .xlsx or .xls file
+        sheet: Sheet position or name
+        
+    Returns:
+        Tuple containing:
+            - DataFrame with the matched columns, named as in the file (only
+              the header when a required column is missing)
+            - All column names of the file
+    """
+    with pd.ExcelFile(file_path, engine=excel_engine()) as workbook:
+        header_df = workbook.parse(sheet_name=sheet, nrows=0)
+        column_names = list(header_df.columns)
+        
+        matched = list(resolve_columns(column_names).values())
+        if None in matched:
+            return header_df, column_names
+        
+        positions = sorted({column_names.index(column) for column in matched})
+        df = workbook.parse(sheet_name=sheet, usecols=positions)
+    
+    # Names as in the full header (duplicate names are numbered over all columns)
+    df.columns = [column_names[position] for position in positions]
+    return df, column_names
+
+def deduplicate_foto(df: pd.DataFrame, foto_column: str,
+                     sheet_rows=None) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Remove rows with duplicate FOTO values, keeping for each FOTO the row with
+    the most non-null values (the first one on ties).
+    
+    Args:
+        df: DataFrame without missing FOTO values
+        foto_column: Actual name of the FOTO column
+        sheet_rows: Spreadsheet row number of each row of df, for reporting
+            (defaults to the dataframe index)
+        
+    Returns:
+        Tuple containing:
+            - DataFrame without duplicates (original index and order kept)
+            - One dictionary per collapsed FOTO value, with the value, the
+              number of rows found, the number removed, and the spreadsheet
+              rows kept and removed
+    """
+    foto_values = df[foto_column].astype(str)
+    duplicate_mask = foto_values.duplicated(keep=False)
+    if not duplicate_mask.any():
+        return df, []
+    
+    # Best row of every FOTO value: idxmax returns the first maximum
+    info_count = df.notna().sum(axis=1)
+    best_rows = info_count.groupby(foto_values, sort=False).idxmax()
+    keep_mask = df.index.isin(best_rows.values)
+    
+    # Per-group statistics, in order of first appearance
+    if sheet_rows is None:
+        sheet_rows = np.asarray(df.index)
+    sheet_rows = pd.Series(np.asarray(sheet_rows), index=df.index)
+    duplicate_groups = []
+    for foto, indices in foto_values[duplicate_mask].groupby(foto_values[duplicate_mask], sort=False).groups.items():
+        kept = best_rows[foto]
+        duplicate_groups.append({
+            "foto": foto,
+            "rows": len(indices),
+            "removed": len(indices) - 1,
+            "kept_row": int(sheet_rows[kept]),
+            "removed_rows": [int(sheet_rows[idx]) for idx in indices if idx != kept],
+        })
+    
+    return df[keep_mask], duplicate_groups
+
+def parse_excel_file(file_path: str, sheet=0, table=0) -> Tuple[bool, Dict[str, Any], str]:
     """
     Parse an Excel or Numbers file and extract key information.
     Also validates that the file contains all required columns.
@@ -212,6 +671,8 @@ def parse_excel_file(file_path: str) -> Tuple[bool, Dict[str, Any], str]:
     
     Args:
         file_path: Path to the Excel file
+        sheet: Sheet position or name (the first sheet by default)
+        table: Table position or name within the sheet, for Numbers files
         
     Returns:
         Tuple containing:
@@ -225,31 +686,30 @@ def parse_excel_file(file_path: str) -> Tuple[bool, Dict[str, Any], str]:
         
         # Read the Excel or Numbers file into a pandas DataFrame
         if file_extension == '.numbers':
-            if NumbersDocument is None:
+            if load_numbers_document() is None:
                 return False, {}, "Per supportare i file Numbers, installa la libreria numbers-parser: pip install numbers-parser"
             
             try:
-                df = numbers_to_dataframe(file_path)
+                df, column_names = read_numbers_columns(file_path, sheet, table)
             except Exception as e:
                 return False, {}, f"Errore nell'apertura del file Numbers: {str(e)}"
         else:
-            # Regular Excel file
-            df = pd.read_excel(file_path)
+            # Regular Excel file: header first, then only the required columns
+            df, column_names = read_excel_columns(file_path, sheet)
         
         # Extract basic information
         original_rows = len(df)
         info = {
             "rows": original_rows,
-            "columns": len(df.columns),
-            "column_names": list(df.columns),
+            "columns": len(column_names),
+            "column_names": column_names,
         }
         
         # Check for required columns with fuzzy matching
         missing_columns = []
         column_mapping = {}  # Maps required column names to actual column names
         
-        for column in REQUIRED_COLUMNS:
-            matched_column = match_column_name(column, list(df.columns))
+        for column, matched_column in resolve_columns(column_names).items():
             if matched_column:
                 column_mapping[column] = matched_column
             else:
@@ -268,50 +728,20 @@ def parse_excel_file(file_path: str) -> Tuple[bool, Dict[str, Any], str]:
         missing_foto_mask = df[foto_column].isna() | (df[foto_column] == "")
         missing_foto_rows = missing_foto_mask.sum()
         
+        # Spreadsheet row numbers (header is row 1), used to report duplicates
+        sheet_rows = np.asarray(df.index[~missing_foto_mask]) + 2
+        
         # Remove rows with missing FOTO values
         if missing_foto_rows > 0:
             df = df[~missing_foto_mask].reset_index(drop=True)
             print(f"Removed {missing_foto_rows} rows with missing FOTO values")
         
         # Step 2: Deal with duplicates in FOTO column
-        # Find duplicates
-        foto_values = df[foto_column].astype(str)
-        duplicate_mask = foto_values.duplicated(keep=False)
-        duplicates = foto_values[duplicate_mask].unique()
-        
-        duplicate_rows_removed = 0
+        df, duplicate_groups = deduplicate_foto(df, foto_column, sheet_rows)
+        duplicate_rows_removed = sum(group["removed"] for group in duplicate_groups)
         
-        # Remove duplicates, keeping rows with most information
-        if len(duplicates) > 0:
-            print(f"Found {len(duplicates)} duplicate FOTO values")
-            
-            # Create a helper column to count non-null values
-            df['_info_count'] = df.notna().sum(axis=1)
-            
-            # Process each duplicate value
-            cleaned_df = df.copy()
-            for dup_value in duplicates:
-                # Get all rows with this duplicate value
-                dup_rows = df[df[foto_column] == dup_value]
-                
-                if len(dup_rows) > 1:
-                    # Find the row with the most information
-                    best_row_idx = dup_rows['_info_count'].idxmax()
-                    
-                    # Remove all other duplicates from cleaned_df
-                    dup_indices = dup_rows.index.tolist()
-                    dup_indices.remove(best_row_idx)  # Keep the best row
-                    cleaned_df = cleaned_df.drop(dup_indices)
-                    
-                    # Count removed rows
-                    duplicate_rows_removed += len(dup_indices)
-            
-            # Remove helper column
-            cleaned_df = cleaned_df.drop('_info_count', axis=1)
-            
-            # Update dataframe
-            df = cleaned_df
-            
+        if duplicate_groups:
+            print(f"Found {len(duplicate_groups)} duplicate FOTO values")
             print(f"Removed {duplicate_rows_removed} duplicate rows")
         
         # Total rows removed
@@ -322,6 +752,7 @@ def parse_excel_file(file_path: str) -> Tuple[bool, Dict[str, Any], str]:
         info["total_rows_removed"] = total_rows_removed
         info["missing_foto_rows"] = missing_foto_rows
         info["duplicate_rows_removed"] = duplicate_rows_removed
+        info["duplicate_groups"] = duplicate_groups
         
         # Save the cleaned dataframe
         info["cleaned_df"] = df
@@ -336,13 +767,250 @@ def parse_excel_file(file_path: str) -> Tuple[bool, Dict[str, Any], str]:
     
     except Exception as e:
         return False, {}, f"Errore nell'analisi del file: {str(e)}"
+
+# Spreadsheets parsed in this session: (absolute path, sheet, table) -> (size, mtime_ns, result)
+_parse_cache: Dict[Tuple[str, Any, Any], Tuple[int, int, Tuple[bool, Dict[str, Any], str]]] = {}
+_parse_cache_lock = threading.Lock()
+PARSE_CACHE_SIZE = 4
+
+def parse_excel_file_cached(file_path: str, sheet=0, table=0) -> Tuple[bool, Dict[str, Any], str]:
+    """
+    Parse a spreadsheet like parse_excel_file, reusing the result of an
+    earlier parse of the same file in this session.
+    
+    The cached result is used only while the file keeps the same size and
+    modification time; a file changed on disk is parsed again. The returned
+    cleaned_df is shared between callers and must not be modified in place.
+    
+    Args:
+        file_path: Path to the Excel or Numbers file
+        sheet: Sheet position or name
+        table: Table position or name within the sheet, for Numbers files
+        
+    Returns:
+        Same tuple as parse_excel_file
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return parse_excel_file(file_path, sheet, table)
+    
+    key = (os.path.abspath(file_path), sheet, table)
+    with _parse_cache_lock:
+        cached = _parse_cache.get(key)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    
+    result = parse_excel_file(file_path, sheet, table)
+    with _parse_cache_lock:
+        _parse_cache.pop(key, None)
+        if result[0]:
+            _parse_cache[key] = (stat.st_size, stat.st_mtime_ns, result)
+            # Keep only the most recently parsed files
+            while len(_parse_cache) > PARSE_CACHE_SIZE:
+                del _parse_cache[next(iter(_parse_cache))]
+    return result
+
+def clear_parse_cache() -> None:
+    """Forget all spreadsheets parsed in this session."""
+    with _parse_cache_lock:
+        _parse_cache.clear()
     
-def check_image_folder(folder_path: str) -> Tuple[bool, Dict[str, Any], str]:
+# Image folders indexed in this session: absolute path -> (folder mtime_ns, index)
+_image_index_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+_image_index_lock = threading.Lock()
+
+def build_image_index(folder_path: str) -> Dict[str, Any]:
+    """
+    Index the images at the first level of a folder with a single scandir pass.
+    
+    Files are keyed by their normalized, lowercased name (see
+    normalize_image_filename), so lookups tolerate the small naming errors of
+    the spreadsheet and ignore case, whatever the file system does.
+    
+    Args:
+        folder_path: Path to the folder to index
+        
+    Returns:
+        Dictionary with:
+            - "files": normalized lowercase name -> actual filename
+            - "names": set of the actual image filenames
+            - "total_images": number of images
+            - "image_types": number of images per extension
+    """
+    files = {}
+    names = set()
+    image_types = {}
+    
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            # is_file() uses the directory listing, no extra stat on most systems
+            if not entry.is_file():
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext not in IMAGE_EXTENSIONS:
+                continue
+            
+            names.add(entry.name)
+            image_types[ext] = image_types.get(ext, 0) + 1
+            files.setdefault(normalize_image_filename(entry.name).lower(), entry.name)
+    
+    return {
+        "files": files,
+        "names": names,
+        "total_images": len(names),
+        "image_types": image_types,
+    }
+
+def get_image_index(folder_path: str) -> Dict[str, Any]:
+    """
+    Return the image index of a folder, reusing the one built earlier in this
+    session while the folder's modification time is unchanged (adding,
+    removing or renaming files changes it).
+    
+    Args:
+        folder_path: Path to the folder
+        
+    Returns:
+        Index as returned by build_image_index
+    """
+    key = os.path.abspath(folder_path)
+    mtime_ns = os.stat(folder_path).st_mtime_ns
+    with _image_index_lock:
+        cached = _image_index_cache.get(key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    
+    index = build_image_index(folder_path)
+    with _image_index_lock:
+        _image_index_cache[key] = (mtime_ns, index)
+    return index
+
+def lookup_image(index: Dict[str, Any], filename: str) -> Optional[str]:
+    """
+    Find the actual file for a (normalized) image filename.
+    
+    Args:
+        index: Image index from get_image_index
+        filename: Filename as normalized by normalize_image_filename
+        
+    Returns:
+        The actual filename in the folder, or None if there is no such image
+    """
+    if filename in index["names"]:
+        return filename
+    return index["files"].get(normalize_image_filename(filename).lower())
+
+# Bytes read from the end of a JPEG to look for its end-of-image marker
+JPEG_TAIL_BYTES = 64
+
+def read_image_header(image_path: str) -> Dict[str, Any]:
+    """
+    Read what processing needs to know about a photo from its header,
+    without decoding the pixels.
+    
+    Args:
+        image_path: Path to the image
+        
+    Returns:
+        Dictionary with:
+            - "bytes", "mtime_ns": size and modification time of the file
+            - "format", "mode", "size" ([width, height]) and EXIF "orientation"
+              (1 when absent), None when the image cannot be read
+            - "error": why the image cannot be read at all, or None
+            - "warnings": problems that may spoil or stop its processing
+              (truncated JPEG, crop box outside the image)
+    """
+    header = {"bytes": None, "mtime_ns": None, "format": None, "mode": None, "size": None,
+              "orientation": None, "error": None, "warnings": []}
+    try:
+        stat = os.stat(image_path)
+        header["bytes"], header["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+        with Image.open(image_path) as img:
+            header["format"], header["mode"], header["size"] = img.format, img.mode, list(img.size)
+            header["orientation"] = int(img.getexif().get(0x0112, 1))
+            
+            # A complete JPEG ends with the EOI marker (some cameras pad it with zeros)
+            if img.format == "JPEG":
+                img.fp.seek(max(0, stat.st_size - JPEG_TAIL_BYTES))
+                if not img.fp.read().rstrip(b"\x00").endswith(b"\xff\xd9"):
+                    header["warnings"].append("file JPEG incompleto (manca la fine dell'immagine)")
+        
+        # The website crop must lie inside the photo
+        width, height = header["size"]
+        left, upper, right, lower = rotated_crop_box((width, height))
+        if left < 0 or upper < 0 or right > width or lower > height:
+            header["warnings"].append(f"dimensioni inattese {width}x{height}: il ritaglio esce dall'immagine")
+    except Image.UnidentifiedImageError:
+        # Same message as process_image_task
+        header["error"] = f"cannot identify image file {image_path!r}"
+    except Exception as e:
+        header["error"] = str(e)
+    return header
+
+def scan_image_headers(folder_path: str, index: Dict[str, Any], names=None,
+                       workers: int = 8) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the headers of the images of a folder on a thread pool (see
+    read_image_header) and keep them in the image index for the transform
+    stage. A header read earlier is reused while the file keeps the same
+    size and modification time.
+    
+    Args:
+        folder_path: Path to the folder
+        index: Image index of the folder from get_image_index; its "headers"
+            entry (filename -> header) is filled in
+        names: Filenames to scan (all the images of the index by default)
+        workers: Number of headers read at the same time
+        
+    Returns:
+        Dictionary filename -> header of the scanned images
+    """
+    known = index.get("headers", {})
+    names = sorted(index["names"] if names is None else names)
+    
+    def scan(name):
+        image_path = os.path.join(folder_path, name)
+        header = known.get(name)
+        if header is not None:
+            try:
+                stat = os.stat(image_path)
+                if [header["bytes"], header["mtime_ns"]] == [stat.st_size, stat.st_mtime_ns]:
+                    return header
+            except OSError:
+                pass
+        return read_image_header(image_path)
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        headers = dict(zip(names, pool.map(scan, names)))
+    with _image_index_lock:
+        index.setdefault("headers", {}).update(headers)
+    return headers
+
+def image_problems(headers: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Describe the images whose header shows a problem.
+    
+    Args:
+        headers: Dictionary filename -> header from scan_image_headers
+        
+    Returns:
+        Dictionary filename -> description, for the images with an error or warnings
+    """
+    return {name: header["error"] or "; ".join(header["warnings"])
+            for name, header in sorted(headers.items()) if header["error"] or header["warnings"]}
+
+def check_image_folder(folder_path: str, scan_headers: bool = True,
+                       workers: int = 8) -> Tuple[bool, Dict[str, Any], str]:
     """
     Checks a folder to validate and count images at the first level only.
     
     Args:
         folder_path: Path to the folder to check
+        scan_headers: Also read the header of every image (see
+            scan_image_headers), so unreadable photos and unexpected sizes are
+            found before processing
+        workers: Number of headers read at the same time
         
     Returns:
         Tuple containing:
@@ -357,28 +1025,10 @@ def check_image_folder(folder_path: str) -> Tuple[bool, Dict[str, Any], str]:
         print(f"DEBUG: Not a directory: {folder_path}")
         return False, {}, "La cartella non esiste"
     
-    # Analyze images in the folder
-    image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
-    image_count = 0
-    image_types = {}
-    
     try:
-        # Walk through the folder (only first level)
-        print(f"DEBUG: Listing directory contents")
-        for file in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, file)
-            print(f"DEBUG: Found file: {file_path}")
-            
-            if os.path.isfile(file_path):
-                # Check file extension
-                ext = os.path.splitext(file_path)[1].lower()
-                print(f"DEBUG: File extension: {ext}")
-                
-                if ext in image_extensions:
-                    image_count += 1
-                    # Count by image type
-                    image_types[ext] = image_types.get(ext, 0) + 1
-                    print(f"DEBUG: Found image: {file}, count now: {image_count}")
+        # Index the folder (only first level); process_files reuses the index
+        index = get_image_index(folder_path)
+        image_count = index["total_images"]
         
         print(f"DEBUG: Total images found: {image_count}")
         if image_count == 0:
@@ -388,11 +1038,23 @@ def check_image_folder(folder_path: str) -> Tuple[bool, Dict[str, Any], str]:
         # Prepare info dictionary
         info = {
             "total_images": image_count,
-            "image_types": image_types
+            "image_types": index["image_types"]
         }
+        message = "Cartella analizzata con successo"
+        
+        if scan_headers:
+            headers = scan_image_headers(folder_path, index, workers=workers)
+            unreadable = sorted(name for name, header in headers.items() if header["error"])
+            info["unreadable_images"] = unreadable
+            info["image_problems"] = image_problems(headers)
+            if len(unreadable) == image_count:
+                return False, {}, "La cartella non contiene immagini leggibili"
+            if info["image_problems"]:
+                message += (f" ({len(unreadable)} immagini non leggibili, "
+                            f"{len(info['image_problems']) - len(unreadable)} da controllare)")
         
         print(f"DEBUG: Success, returning info: {info}")
-        return True, info, "Cartella analizzata con successo"
+        return True, info, message
     
     except Exception as e:
         print(f"DEBUG: Error occurred: {str(e)}")
@@ -410,90 +1072,58 @@ def generate_crop_images(df, foto_column, images_folder, output_path,
     # This will be filled in later
     pass
 
-def generate_csv_output(df, output_path, column_mapping):
+def generate_csv_output(df, output_path, column_mapping, chunk_size: int = 60):
     """
     Generate CSV file for website import with specific column order and names.
     
+    The rows are split into ceil(rows / chunk_size) files of (nearly) equal
+    size, named import_campioni_<n>di<total>.csv.
+    
     Args:
         df: DataFrame with valid rows (already cleaned and filtered)
         output_path: Path to save the CSV file
         column_mapping: Mapping from original column names to their actual names in the dataframe
+        chunk_size: Maximum number of rows per CSV file (at least 1)
         
     Returns:
         Dictionary with processing information
+        
+    Raises:
+        ValueError: If chunk_size is less than 1
     """
+    if chunk_size < 1:
+        raise ValueError(f"Righe per file CSV non valide: {chunk_size}")
+    
     try:
-        
-        # Define the CSV columns in the exact order required
-        CSV_COLUMNS = [
-            "tax:casse", "tax:categorie", "cf:foto", "cf:foto_dettaglio", "tax:composizioni",
-            "cf:codice", "cf:fornitore", "cf:art_fornitore", "cf:unita_di_misura", "cf:altezza",
-            "cf:peso", "tax:armature", "tax:lavorazioni", "tax:descrizioni", "tax:motivi",
-            "tax:sostenibili", "cf:certificazione"
-        ]
-        
-        # Mapping from CSV columns to Excel columns
-        CSV_TO_EXCEL_MAPPING = {
-            "tax:casse": "POSIZIONE",
-            "tax:categorie": "CATEGORIA",
-            "cf:foto": "FOTO",
-            "cf:foto_dettaglio": "FOTO DETTAGLIO",
-            "tax:composizioni": "COMPOSIZIONE",
-            "cf:codice": "CODICE TAILOR",
-            "cf:fornitore": "FORNITORE",
-            "cf:art_fornitore": "ART. FORNITORE",
-            "cf:unita_di_misura": "UNITA' DI MISURA",
-            "cf:altezza": "ALTEZZA",
-            "cf:peso": "PESO",
-            "tax:armature": "ARMATURA",
-            "tax:lavorazioni": "LAVORAZIONE",
-            "tax:descrizioni": "DESCRIZIONE",
-            "tax:motivi": "MOTIVO",
-            "tax:sostenibili": "SOSTENIBILITA'",
-            "cf:certificazione": "CERTIFICAZIONE"
-        }
-        
-        # Create a new DataFrame with the CSV columns
-        csv_df = pd.DataFrame(columns=CSV_COLUMNS)
-        total_rows = len(df)
-        chunk_size = 60
+        # Select and rename all CSV columns in one step; columns missing from
+        # the dataframe are exported empty
+        source_columns = [column_mapping.get(CSV_TO_EXCEL_MAPPING.get(csv_col))
+                          for csv_col in CSV_COLUMNS]
+        source_columns = [col if col in df.columns else None for col in source_columns]
+        csv_df = df.reindex(columns=source_columns, fill_value="")
+        csv_df.columns = CSV_COLUMNS
+        
+        total_rows = len(csv_df)
         chunk_number = (total_rows + chunk_size - 1) // chunk_size  # Ceiling division
-        csv_paths =[]
-
-        split_df = np.array_split(df, chunk_number)
-        
-        for j, chunk_df in enumerate(split_df):
-            # For each row in the valid data, map to the CSV format
-            for i, row in chunk_df.iterrows():
-                csv_row = {}
-                
-                # For each CSV column, get the corresponding Excel column and value
-                for csv_col in CSV_COLUMNS:
-                    excel_col = CSV_TO_EXCEL_MAPPING.get(csv_col)
-                    if excel_col:
-                        # Get the actual column name from the mapping (handles case/spelling variations)
-                        actual_col = column_mapping.get(excel_col)
-                        if actual_col in row:
-                            csv_row[csv_col] = row[actual_col]
-                        else:
-                            csv_row[csv_col] = ""  # Handle missing columns
-                    else:
-                        csv_row[csv_col] = ""  # Handle unmapped columns
-                
-                # Add the row to the CSV DataFrame
-                csv_df = pd.concat([csv_df, pd.DataFrame([csv_row])], ignore_index=True)
+        csv_paths = []
+        
+        # Same split as np.array_split: the first (total_rows % chunk_number)
+        # chunks get one row more
+        if chunk_number:
+            base_size, extra = divmod(total_rows, chunk_number)
+        for j in range(chunk_number):
+            start = j * base_size + min(j, extra)
+            stop = start + base_size + (1 if j < extra else 0)
             
             # Create CSV file path
-            csv_fiemane = f"import_campioni_{j+1}di{chunk_number}.csv"
-            csv_path = os.path.join(output_path, csv_fiemane)
+            csv_filename = f"import_campioni_{j+1}di{chunk_number}.csv"
+            csv_path = os.path.join(output_path, csv_filename)
             csv_paths.append(csv_path)
             
-            # Export DataFrame to CSV
-            print("csv df chunk", csv_df.head())
-            csv_df.to_csv(csv_path, index=False)
-            csv_df = pd.DataFrame(columns=CSV_COLUMNS)
+            # Export the chunk to CSV
+            csv_df.iloc[start:stop].to_csv(csv_path, index=False)
         
-        return {"success": True, "csv_path": csv_paths, "rows": len(csv_df)}
+        return {"success": True, "csv_path": csv_paths, "rows": total_rows}
         
     except Exception as e:
         import traceback
@@ -501,8 +1131,655 @@ def generate_csv_output(df, output_path, column_mapping):
         print(f"Error generating CSV: {str(e)}")
         return {"success": False, "error": str(e)}
 
+@contextlib.contextmanager
+def file_lock(lock_path: str):
+    """Hold an exclusive lock on lock_path, shared by all processes on this machine."""
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class ImageCache:
+    """
+    Persistent store of generated thumbnails and crops, shared between runs.
+    
+    Entries are keyed by the source file (path, size, mtime) and by the
+    transform parameters, so a changed photo or a changed setting is a miss.
+    The total size is bounded; the least recently used entries are evicted
+    when the index is saved.
+    
+    Several runs may use the same cache folder at once, in this process
+    (use get_image_cache to share one instance) or in others: saving merges
+    with the index on disk under a file lock, and entries pinned by a run
+    in progress (see pin) are never evicted.
+    """
+    
+    INDEX_FILENAME = "index.json"
+    PINS_DIRNAME = "in_use"
+    
+    # Pins of runs that died without removing them stop counting after this
+    PIN_MAX_AGE = 24 * 3600
+    
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024**3) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._removed = {}  # key -> time it was dropped by this instance
+        os.makedirs(os.path.join(cache_dir, self.PINS_DIRNAME), exist_ok=True)
+        
+        # Index: key -> {"files": {role: filename}, "bytes": int, "last_used": float}
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILENAME)
+        self.entries = {}
+        self.refresh()
+    
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _merge(self, entries: Dict[str, Any]) -> None:
+        """Add the entries of another index, keeping the most recently used version."""
+        for key, entry in entries.items():
+            if entry["last_used"] <= self._removed.get(key, -1):
+                continue  # dropped here after it was last used
+            current = self.entries.get(key)
+            if current is None or current["last_used"] < entry["last_used"]:
+                self.entries[key] = entry
+    
+    def refresh(self) -> None:
+        """Pick up the entries saved by other runs since the index was read."""
+        entries = self._read_index()
+        with self._lock:
+            self._merge(entries)
+    
+    def key(self, source_path: str, params: Dict[str, Any]) -> str:
+        """Build the cache key of a source file for the given transform parameters."""
+        stat = os.stat(source_path)
+        signature = [os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns, params]
+        return hashlib.sha1(json.dumps(signature, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Look up an entry.
+        
+        Returns:
+            Dictionary role -> cached file path, or None on a miss
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                files = {role: os.path.join(self.cache_dir, name) for role, name in entry["files"].items()}
+                if all(os.path.isfile(path) for path in files.values()):
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    return files
+                del self.entries[key]
+                self._removed[key] = time.time()
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, files: Dict[str, Any]) -> None:
+        """
+        Store freshly generated outputs in the cache.
+        
+        Args:
+            key: Cache key from key()
+            files: Dictionary role -> (path, data); data is the encoded
+                file when it only exists in memory, otherwise None
+        """
+        if not all(data or os.path.isfile(path) for path, data in files.values()):
+            return
+        
+        names = {}
+        total_bytes = 0
+        for role, (path, data) in files.items():
+            name = f"{key}_{role}{os.path.splitext(path)[1]}"
+            # Another run may store the same entry at the same time
+            tmp_path = os.path.join(self.cache_dir, f"{name}.{os.getpid()}.{threading.get_ident()}.part")
+            if data:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                total_bytes += len(data)
+            else:
+                shutil.copyfile(path, tmp_path)
+                total_bytes += os.path.getsize(path)
+            os.replace(tmp_path, os.path.join(self.cache_dir, name))
+            names[role] = name
+        with self._lock:
+            self.entries[key] = {"files": names, "bytes": total_bytes, "last_used": time.time()}
+    
+    def pin(self, keys, token: Optional[str] = None) -> str:
+        """
+        Protect entries from eviction, by any run, until unpin is called:
+        the workbook of a run embeds cached thumbnails only when it is closed.
+        
+        Args:
+            keys: Cache keys used by the run
+            token: Token of an earlier pin of the same run, to replace its keys
+            
+        Returns:
+            Token to pass to unpin
+        """
+        token = token or f"{os.getpid()}_{threading.get_ident()}_{time.time_ns()}"
+        path = os.path.join(self.cache_dir, self.PINS_DIRNAME, token + ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(sorted(keys), f)
+        os.replace(path + ".tmp", path)
+        return token
+    
+    def unpin(self, token: str) -> None:
+        """Remove a pin made by pin."""
+        try:
+            os.remove(os.path.join(self.cache_dir, self.PINS_DIRNAME, token + ".json"))
+        except OSError:
+            pass
+    
+    def pinned_keys(self) -> set:
+        """Keys pinned by the runs in progress, in any process."""
+        pinned = set()
+        pins_dir = os.path.join(self.cache_dir, self.PINS_DIRNAME)
+        for name in os.listdir(pins_dir):
+            path = os.path.join(pins_dir, name)
+            try:
+                if not name.endswith(".json"):
+                    continue
+                if time.time() - os.path.getmtime(path) > self.PIN_MAX_AGE:
+                    os.remove(path)
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    pinned.update(json.load(f))
+            except (OSError, ValueError):
+                pass  # removed meanwhile, or being written
+        return pinned
+    
+    def evict(self) -> None:
+        """Remove least recently used, unpinned entries until the cache fits in max_bytes."""
+        with self._lock:
+            pinned = self.pinned_keys()
+            total_bytes = sum(entry["bytes"] for entry in self.entries.values())
+            for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+                if total_bytes <= self.max_bytes:
+                    break
+                if key in pinned:
+                    continue
+                entry = self.entries.pop(key)
+                self._removed[key] = time.time()
+                for name in entry["files"].values():
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+                total_bytes -= entry["bytes"]
+    
+    def save(self) -> None:
+        """
+        Merge with the index saved by other runs, evict down to the size
+        limit and write the index atomically.
+        """
+        with self._lock, file_lock(self.index_path + ".lock"):
+            self._merge(self._read_index())
+            self.evict()
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.index_path)
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counts of this session, and the current cache size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": sum(entry["bytes"] for entry in self.entries.values()),
+            }
+
+# Image caches opened in this process: absolute folder -> ImageCache
+_image_caches: Dict[str, ImageCache] = {}
+_image_caches_lock = threading.Lock()
+
+def get_image_cache(cache_dir: str, max_bytes: int = 2 * 1024**3) -> ImageCache:
+    """
+    Return the ImageCache of a folder, shared by all the runs of this
+    process, with the entries saved since by other processes.
+    
+    Args:
+        cache_dir: Cache folder
+        max_bytes: Size limit of the cache (the latest value is used)
+        
+    Returns:
+        The shared ImageCache
+    """
+    key = os.path.abspath(cache_dir)
+    with _image_caches_lock:
+        cache = _image_caches.get(key)
+        if cache is None:
+            cache = _image_caches[key] = ImageCache(cache_dir, max_bytes)
+            return cache
+    cache.max_bytes = max_bytes
+    cache.refresh()
+    return cache
+
+class RunJournal:
+    """
+    On-disk record of the rows of a run whose output files are complete.
+
+    The journal lives in the output folder while a run is in progress; it is
+    removed once the run completes, or kept for the next run in incremental
+    mode. The next run with the same settings skips every row whose source
+    photo and output files are unchanged, and only rebuilds the workbook and
+    the CSVs. Each row also stores a fingerprint of its spreadsheet values,
+    so a rerun can tell which rows were edited.
+
+    Rows are appended as JSON lines after their files were moved into place,
+    so a row is never recorded before its outputs are complete; a line torn
+    by a crash is ignored.
+    """
+
+    FILENAME = ".journal.jsonl"
+    VERSION = 1
+
+    def __init__(self, output_path: str, params: Dict[str, Any]) -> None:
+        self.output_path = output_path
+        self.path = os.path.join(output_path, self.FILENAME)
+        self.header = {"version": self.VERSION, "params": params}
+
+        # Entries: normalized FOTO -> {"foto", "source": [size, mtime_ns],
+        #                              "files": {role: [name, bytes]}, "row": fingerprint}
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            if lines and json.loads(lines[0]) == self.header:
+                for line in lines[1:]:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self.entries[entry["foto"]] = entry
+        except (OSError, ValueError):
+            self.entries = {}
+
+        # Start from a compacted copy: drops torn lines and journals of other settings
+        self.file = None
+        self.rewrite()
+
+    def rewrite(self) -> None:
+        """Atomically replace the journal with one line per current entry."""
+        if self.file is not None:
+            self.file.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.header) + "\n")
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def source_signature(source_path: str) -> List[int]:
+        """Size and modification time of a source photo."""
+        stat = os.stat(source_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def get(self, foto: str, source: List[int]) -> Optional[Dict[str, str]]:
+        """
+        Look up a finished row.
+
+        Args:
+            foto: Normalized FOTO value of the row
+            source: source_signature() of its photo
+
+        Returns:
+            Dictionary role -> output file path, or None when the row has to
+            be processed again (not finished, photo changed, files missing)
+        """
+        entry = self.entries.get(foto)
+        if entry is None or entry["source"] != source:
+            return None
+        files = {}
+        for role, (name, size) in entry["files"].items():
+            path = os.path.join(self.output_path, name)
+            try:
+                if os.path.getsize(path) != size:
+                    return None
+            except OSError:
+                return None
+            files[role] = path
+        return files
+
+    @staticmethod
+    def row_fingerprint(values: List[Any]) -> str:
+        """Hash of the values written for a row."""
+        return hashlib.sha1(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+
+    def previous_fingerprint(self, foto: str) -> Optional[str]:
+        """Fingerprint recorded for a row, or None if the row is new."""
+        entry = self.entries.get(foto)
+        return entry.get("row") if entry is not None else None
+
+    def record(self, foto: str, source: List[int], files: Dict[str, str],
+               row: Optional[str] = None) -> None:
+        """Append a finished row; files maps role -> output file path."""
+        entry = {
+            "foto": foto,
+            "source": source,
+            "files": {role: [os.path.relpath(path, self.output_path), os.path.getsize(path)]
+                      for role, path in files.items()},
+            "row": row,
+        }
+        self.entries[foto] = entry
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def retain(self, fotos: set) -> set:
+        """
+        Drop the rows that are no longer in the spreadsheet.
+
+        Args:
+            fotos: Normalized FOTO values of the current rows
+
+        Returns:
+            Set of the output file paths still referenced by the journal
+        """
+        self.entries = {foto: entry for foto, entry in self.entries.items() if foto in fotos}
+        self.rewrite()
+        return {os.path.join(self.output_path, name)
+                for entry in self.entries.values() for name, _ in entry["files"].values()}
+
+    def close(self) -> None:
+        self.file.close()
+
+    def remove(self) -> None:
+        """Close and delete the journal once the run has completed."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+@contextlib.contextmanager
+def timed(timings: Optional[Dict[str, float]], name: str):
+    """Add the duration of the block to timings[name]; does nothing when timings is None."""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+class StageTimings:
+    """
+    Instrumentation of one process_files run.
+    
+    Collects the wall-clock seconds of each stage, the seconds of each image
+    operation summed over all photos (measured in the workers and merged
+    here), and the bytes read and written.
+    """
+    
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.stages = {}      # stage -> seconds
+        self.operations = {}  # image operation -> seconds
+        self.images = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+    
+    def stage(self, name: str):
+        """Context manager timing one stage."""
+        return timed(self.stages, name)
+    
+    def add_image(self, stats: Dict[str, Any]) -> None:
+        """Merge the statistics returned by process_image_task for one photo."""
+        self.images += 1
+        for operation, seconds in stats["operations"].items():
+            self.operations[operation] = self.operations.get(operation, 0.0) + seconds
+        self.bytes_read += stats["bytes_read"]
+        self.bytes_written += stats["bytes_written"]
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": round(time.perf_counter() - self.start, 4),
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "image_operations": {name: round(seconds, 4) for name, seconds in self.operations.items()},
+            "images": self.images,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+# Labels of the stages in the status summary
+STAGE_LABELS = {
+    "parse": "lettura file",
+    "scan": "indice immagini",
+    "preflight": "controllo immagini",
+    "plan": "preparazione",
+    "normalize": "normalizzazione",
+    "images": "immagini",
+    "rows": "righe Excel",
+    "workbook": "salvataggio Excel",
+    "csv": "CSV",
+}
+
+def format_timings(timings: Dict[str, Any]) -> str:
+    """
+    Summarize the timings of a run in one line for the status area.
+    
+    Args:
+        timings: The "timings" entry of the process_files results
+        
+    Returns:
+        Text like "Tempi: lettura file 0.2s, immagini 12.3s, ... (totale 14.0s)"
+    """
+    parts = [f"{label} {timings['stages'][stage]:.1f}s"
+             for stage, label in STAGE_LABELS.items() if stage in timings["stages"]]
+    return f"Tempi: {', '.join(parts)} (totale {timings['total']:.1f}s)"
+
+def write_run_report(report_path: str, report: Dict[str, Any]) -> None:
+    """Write the JSON report of a run atomically."""
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, default=str)
+    os.replace(tmp_path, report_path)
+
+def transform_params(draft: bool = False, crop_variants: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Parameters that determine the thumbnail and crops of a photo."""
+    params = {
+        "thumb_size": list(THUMB_SIZE),
+        "thumb_quality": THUMB_QUALITY,
+        "crop_size": list(CROP_SIZE),
+        "crop_quality": CROP_QUALITY,
+        "crop_geometry": [CROP_WIDTH, CROP_HEIGHT, CROP_DOWNSHIFT],
+        "draft": draft,
+    }
+    if crop_variants:
+        params["crop_variants"] = crop_variants
+    return params
+
+# (full_image_path, thumb_path, crop_path, draft, crop_variants, header[, data]),
+# see process_image_task
+ImageTask = Union[
+    Tuple[str, Optional[str], str, bool, Tuple[Tuple[str, Dict[str, Any]], ...], Optional[Dict[str, Any]]],
+    Tuple[str, Optional[str], str, bool, Tuple[Tuple[str, Dict[str, Any]], ...], Optional[Dict[str, Any]], bytes],
+]
+
+def process_image_task(task: ImageTask) -> Tuple[Optional[str], Optional[bytes], Dict[str, Any]]:
+    """
+    Open one source image and write its Excel thumbnail and website crop.
+    
+    Runs either in the main process or in a worker of the image pool, so it
+    only takes and returns picklable values.
+    
+    Args:
+        task: Tuple (full_image_path, thumb_path, crop_path, draft,
+            crop_variants, header), with an optional seventh item holding
+            the file content already read (see iter_image_results); with
+            thumb_path None the thumbnail is encoded in memory and returned;
+            crop_variants is a tuple of (output_path, variant) pairs; header
+            is the read_image_header result of the source, or None
+        
+    Returns:
+        Tuple containing:
+            - None if successful, otherwise the error message
+            - The encoded thumbnail when thumb_path is None, otherwise None
+            - Statistics: seconds per image operation, bytes read and written
+    """
+    full_image_path, thumb_path, crop_path, draft, crop_variants, header = task[:6]
+    data = task[6] if len(task) > 6 else None
+    stats = {"operations": {}, "bytes_read": 0, "bytes_written": 0}
+    
+    # Known to be unreadable by the pre-flight scan: do not read the file again
+    if header is not None and header["error"] and data is None:
+        try:
+            stat = os.stat(full_image_path)
+            if [header["bytes"], header["mtime_ns"]] == [stat.st_size, stat.st_mtime_ns]:
+                return header["error"], None, stats
+        except OSError:
+            pass
+    
+    try:
+        stats["bytes_read"] = len(data) if data is not None else os.path.getsize(full_image_path)
+        thumb_buffer = io.BytesIO() if thumb_path is None else None
+        with Image.open(io.BytesIO(data) if data is not None else full_image_path) as img:
+            thumb_ok, crop_ok = transform_image(img, thumb_buffer or thumb_path, crop_path, draft=draft,
+                                                timings=stats["operations"], crop_variants=crop_variants)
+        if not crop_ok:
+            return "ritaglio non creato", None, stats
+        if not thumb_ok:
+            return "miniatura non creata", None, stats
+        thumb_data = thumb_buffer.getvalue() if thumb_buffer is not None else None
+        for path in (crop_path, thumb_path, *(path for path, _ in crop_variants)):
+            if path and os.path.isfile(path):
+                stats["bytes_written"] += os.path.getsize(path)
+        stats["bytes_written"] += len(thumb_data or b"")
+        return None, thumb_data, stats
+    except Image.UnidentifiedImageError as e:
+        # Name the file, as Image.open does when given a path
+        return f"cannot identify image file {full_image_path!r}", None, stats
+    except Exception as e:
+        return str(e), None, stats
+
+def iter_image_results(image_tasks: List[ImageTask], workers: int = 1, read_ahead_bytes: int = 0,
+                       read_threads: int = 4):
+    """
+    Run process_image_task over image_tasks and yield the results in order.
+    
+    With read_ahead_bytes, the source files are read into memory ahead of
+    the decoder on a small thread pool, so slow (network) reads overlap with
+    decoding and encoding. Files read but not processed yet never take more
+    than read_ahead_bytes, except that one file is always let through.
+    
+    Args:
+        image_tasks: Tasks for process_image_task
+        workers: Number of worker processes (1 decodes in the calling process)
+        read_ahead_bytes: Memory ceiling of the read-ahead (0 disables it)
+        read_threads: Number of files read at the same time
+        
+    Yields:
+        The process_image_task result of each task, in task order
+    """
+    executor = None
+    if workers and workers > 1 and len(image_tasks) > 1:
+        # The caller runs other threads (GUI worker, CLI jobs, read-ahead):
+        # start the workers fresh rather than forking a copy of its locks
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+    
+    if not read_ahead_bytes:
+        try:
+            if executor is not None:
+                chunksize = max(1, len(image_tasks) // (workers * 4))
+                yield from executor.map(process_image_task, image_tasks, chunksize=chunksize)
+            else:
+                yield from map(process_image_task, image_tasks)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return
+    
+    def fetch(task):
+        # Files found unreadable by the pre-flight scan are not read again
+        if task[5] is None or not task[5]["error"]:
+            try:
+                with open(task[0], "rb") as f:
+                    task = task + (f.read(),)
+            except OSError:
+                pass  # process_image_task reports the error
+        # A reader thread waits for its worker, so reads run ahead of the pool
+        if executor is not None:
+            return executor.submit(process_image_task, task).result()
+        return task
+    
+    readers = ThreadPoolExecutor(max_workers=read_threads + (workers if executor else 0))
+    in_flight = deque()  # (bytes reserved, future), in task order
+    reserved = 0
+    next_task = 0
+    next_size = None
+    try:
+        while next_task < len(image_tasks) or in_flight:
+            # Read ahead as far as the memory ceiling allows
+            while next_task < len(image_tasks):
+                if next_size is None:
+                    header = image_tasks[next_task][5]
+                    if header is not None and header["bytes"] is not None:
+                        next_size = header["bytes"]  # from the pre-flight scan, no stat
+                    else:
+                        try:
+                            next_size = os.path.getsize(image_tasks[next_task][0])
+                        except OSError:
+                            next_size = 0
+                if in_flight and reserved + next_size > read_ahead_bytes:
+                    break
+                in_flight.append((next_size, readers.submit(fetch, image_tasks[next_task])))
+                reserved += next_size
+                next_task += 1
+                next_size = None
+            
+            size, future = in_flight.popleft()
+            result = future.result()
+            if executor is None:
+                result = process_image_task(result)
+            reserved -= size
+            yield result
+    finally:
+        # Stop the pool first: readers waiting on a cancelled task return at once
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        readers.shutdown(wait=True, cancel_futures=True)
+
 def process_files(excel_path: str, images_folder: str, output_path: str, 
-                  progress_callback=None, status_callback=None):
+                  progress_callback=None, status_callback=None, workers: int = 1,
+                  draft_mode: bool = False, cache_dir: Optional[str] = None,
+                  cache_max_bytes: int = 2 * 1024**3, thumbnails_in_memory: bool = False,
+                  thumb_memory_limit: int = 256 * 1024**2, streaming: bool = False,
+                  csv_chunk_size: int = 60, cancel_callback=None, resume: bool = False,
+                  incremental: bool = False, profile: bool = False,
+                  read_ahead_bytes: int = 0, read_threads: int = 4,
+                  crop_variants: Optional[List[Dict[str, Any]]] = None,
+                  detail_variant: Optional[str] = None):
     """
     Process files to generate Excel output with thumbnails.
     
@@ -512,18 +1789,79 @@ def process_files(excel_path: str, images_folder: str, output_path: str,
         output_path: Path to save outputs
         progress_callback: Function to call with progress updates
         status_callback: Function to call with status messages
+        workers: Number of worker processes for thumbnails and crops
+            (1 processes the images in the calling process). The workers are
+            spawned, so a script using more than one needs the
+            if __name__ == "__main__": guard
+        draft_mode: Decode JPEG photos at reduced resolution (libjpeg DCT
+            scaling); validate with check_draft_quality before enabling
+        cache_dir: Folder of the persistent thumbnail/crop cache (None disables it)
+        cache_max_bytes: Size limit of the cache
+        thumbnails_in_memory: Encode thumbnails in memory and embed them with
+            xlsxwriter's image_data instead of going through temporary files
+        thumb_memory_limit: Memory budget for in-memory thumbnails; once it is
+            used up, the remaining thumbnails are written to temporary files
+        streaming: Write the workbook in xlsxwriter's constant_memory mode, so
+            memory stays flat on very large sheets (rows are always written
+            in order as soon as their image is done)
+        csv_chunk_size: Maximum number of rows per website import CSV file
+        cancel_callback: Function returning True when processing should stop;
+            checked before every row
+        resume: Keep a journal of finished rows in the output folder and skip
+            the rows an interrupted run with the same settings already
+            finished; thumbnails then stay on disk until the run completes
+            (thumbnails_in_memory is ignored)
+        incremental: Like resume, but the journal and the thumbnails are kept
+            after the run, so the next run only processes new or changed
+            photos and rebuilds the workbook and the CSVs from the edited rows
+        profile: Run under cProfile and save the statistics to profile.prof in
+            the output folder (only the calling process is profiled: use
+            workers=1 to include the image operations)
+        read_ahead_bytes: Read the next source photos into memory while the
+            current ones are processed, up to this many bytes (0 disables it);
+            useful when the photos are on a network share
+        read_threads: Number of photos read ahead at the same time
+        crop_variants: Extra website crops made from the same decode, e.g.
+            [{"name": "400", "size": 400, "format": "WEBP", "quality": 75}];
+            see normalize_crop_variants. Written to crops/ as
+            <base>_dettaglio_<name>.<ext>
+        detail_variant: Name of the variant written in the FOTO DETTAGLIO
+            column (Excel and CSV) instead of <base>_dettaglio.jpg
         
     Returns:
         Tuple containing:
             - Boolean indicating success
-            - Dictionary with processing information
+            - Dictionary with processing information, including per-stage
+              "timings" (also written to report_elaborazione.json)
     """
+    if profile:
+        arguments = dict(locals(), profile=False)  # only the parameters at this point
+        import cProfile
+        profiler = cProfile.Profile()
+        success, results = profiler.runcall(process_files, **arguments)
+        try:
+            os.makedirs(output_path, exist_ok=True)
+            profiler.dump_stats(os.path.join(output_path, "profile.prof"))
+            results["profile_path"] = os.path.join(output_path, "profile.prof")
+        except OSError as e:
+            results["profile_error"] = str(e)
+            if status_callback:
+                status_callback(f"Statistiche del profilo non salvate: {str(e)}")
+        return success, results
+
+    timings = StageTimings()
+    cache = pin_token = None
     try:
         # Create output directory
         os.makedirs(output_path, exist_ok=True)
         
-        # Get the cleaned DataFrame from the existing function
-        _, info, _ = parse_excel_file(excel_path)
+        # Get the cleaned DataFrame, reusing the parse done when the file was dropped
+        with timings.stage("parse"):
+            parse_success, info, parse_message = parse_excel_file_cached(excel_path)
+        if not parse_success:
+            if status_callback:
+                status_callback(parse_message)
+            return False, {"error": parse_message}
         df = info["cleaned_df"]
         column_mapping = info["column_mapping"]
         foto_column = column_mapping["FOTO"]
@@ -536,12 +1874,11 @@ def process_files(excel_path: str, images_folder: str, output_path: str,
         # Create necessary directories
         os.makedirs(crops_dir, exist_ok=True)
         
-        # Create a temporary directory for thumbnails
+        # Temporary directory for thumbnails, removed once the workbook is written
         thumbs_dir = os.path.join(output_path, ".thumbnails")
-        os.makedirs(thumbs_dir, exist_ok=True)
         
         # Create Excel workbook
-        workbook = xlsxwriter.Workbook(excel_output_path)
+        workbook = xlsxwriter.Workbook(excel_output_path, {'constant_memory': streaming})
         worksheet = workbook.add_worksheet()
         
         # Configure Excel worksheet
@@ -552,6 +1889,9 @@ def process_files(excel_path: str, images_folder: str, output_path: str,
         # Prepare ordered columns exactly as specified
         ordered_columns = [column_mapping[col] for col in REQUIRED_COLUMNS]
         
+        # Only these columns are kept for the CSV, not whole rows
+        csv_columns = list(dict.fromkeys(ordered_columns))
+        
         # Prepare header with ANTEPRIMA as first column
         header = ['ANTEPRIMA'] + REQUIRED_COLUMNS
         
@@ -561,7 +1901,7 @@ def process_files(excel_path: str, images_folder: str, output_path: str,
         
         # Track missing images and valid rows
         missing_images = []
-        valid_rows_data = []
+        valid_rows_data = []  # values of csv_columns for each written row
         
         # Process each row
         total_rows = len(df)
@@ -569,129 +1909,534 @@ def process_files(excel_path: str, images_folder: str, output_path: str,
             status_callback("Elaborazione in corso...")
         
         df = df.fillna('')
-        # Main processing loop
-        for i, (_, row) in enumerate(df.iterrows()):
-            if progress_callback:
-                progress_callback(i+1, total_rows)
-            
-            # Get image path
-            image_path = str(row[foto_column]) if not pd.isna(row[foto_column]) else ""
-            image_path = normalize_image_filename(image_path)
-            if not image_path:
-                missing_images.append("(Vuoto)")
+
+        crop_variants = normalize_crop_variants(crop_variants)
+        if detail_variant and detail_variant not in (variant["name"] for variant in crop_variants):
+            raise ValueError(f"Variante per FOTO DETTAGLIO non definita: '{detail_variant}'")
+        if csv_chunk_size < 1:
+            raise ValueError(f"Righe per file CSV non valide: {csv_chunk_size}")
+
+        # Persistent cache of thumbnails and crops from previous runs
+        cache = get_image_cache(cache_dir, cache_max_bytes) if cache_dir else None
+        cache_hits = cache_misses = 0
+        params = transform_params(draft_mode, crop_variants)
+
+        # Index the image folder once (reused from check_image_folder when unchanged)
+        with timings.stage("scan"):
+            image_index = get_image_index(images_folder)
+        plan_start = time.perf_counter()
+
+        # Journal of the rows finished by this run and by an interrupted previous one
+        journal = None
+        if resume or incremental:
+            thumbnails_in_memory = False
+            journal = RunJournal(output_path, params)
+        resumed_rows = 0
+        changed_rows = 0
+
+        # Resolve the image of every row at once, and report problems before the image work
+        resolution = resolve_image_files(df[foto_column], image_index)
+        if status_callback and (resolution["missing"] or resolution["near_misses"]):
+            status_callback(f"Foto non trovate: {len(resolution['missing'])} - "
+                            f"nomi corretti automaticamente: {len(resolution['near_misses'])}")
+
+        # Pre-flight: read the headers of the photos to process (those read by
+        # check_image_folder are reused), so problems show before the image work
+        with timings.stage("preflight"):
+            headers = scan_image_headers(images_folder, image_index, set(filter(None, resolution["files"])))
+        problems = image_problems(headers)
+        if status_callback and problems:
+            status_callback(f"Immagini con problemi: {len(problems)} - "
+                            f"{'; '.join(f'{name}: {problem}' for name, problem in list(problems.items())[:3])}")
+
+        # Keep the cache entries of the photos of this run until it ends, whatever
+        # other runs sharing the cache evict meanwhile
+        cache_keys = {}
+        if cache is not None:
+            for image_filename in set(filter(None, resolution["files"])):
+                cache_keys[image_filename] = cache.key(os.path.join(images_folder, image_filename), params)
+            pin_token = cache.pin(cache_keys.values())
+
+        # First pass: plan the image work of every row
+        planned_rows = []  # one dict per row, in row order
+        image_tasks = []   # (full_image_path, thumb_path, crop_path, draft, crop_variants, header) to generate
+        scheduled = {}     # (full_image_path, crop_path) -> planned row whose task writes them
+        for i, (image_path, image_filename) in enumerate(zip(resolution["image_paths"], resolution["files"])):
+            if cancel_callback and cancel_callback():
+                raise ProcessingCancelled()
+
+            planned = {"image_path": image_path, "thumb_path": None, "crop_filename": None,
+                       "cache_key": None, "source": None, "journal_files": None,
+                       "pending": False, "shared": None, "error": None, "thumb_data": None}
+            planned_rows.append(planned)
+            if image_filename is None:
                 continue
-                    
-            full_image_path = os.path.join(images_folder, image_path)
-            
-            # Check if image exists
-            if os.path.isfile(full_image_path):
+            full_image_path = os.path.join(images_folder, image_filename)
+
+            # 1. Thumbnail for Excel
+            thumb_filename = f"thumb_{i}_{os.path.basename(image_path)}"
+            thumb_path = os.path.join(thumbs_dir, thumb_filename)
+
+            # 2. Crop for website, and its extra variants
+            base_name = os.path.splitext(os.path.basename(image_path))[0]
+            crop_filename = f"{base_name}_dettaglio.jpg"
+            crop_path = os.path.join(crops_dir, crop_filename)
+            variant_outputs = tuple((os.path.join(crops_dir, variant_filename(base_name, variant)), variant)
+                                    for variant in crop_variants)
+
+            # Website files of the row: role -> path
+            outputs = {"crop": crop_path}
+            for variant_path, variant in variant_outputs:
+                outputs["crop_" + variant["name"]] = variant_path
+                if variant["name"] == detail_variant:
+                    crop_filename = os.path.basename(variant_path)
+
+            planned["crop_filename"] = crop_filename
+            planned["outputs"] = outputs
+
+            # Already done by an interrupted or previous run
+            if journal is not None:
+                planned["source"] = RunJournal.source_signature(full_image_path)
+                finished = journal.get(image_path, planned["source"])
+                if finished is not None and all(finished.get(role) == path for role, path in outputs.items()):
+                    planned["thumb_path"] = finished["thumb"]
+                    planned["journal_files"] = finished
+                    resumed_rows += 1
+                    continue
+
+            # Same photo and outputs as an earlier row (FOTO values differing only
+            # in case or spaces): one task writes them, both rows use its result
+            shared = scheduled.get((full_image_path, crop_path))
+            if shared is not None:
+                planned["thumb_path"] = shared["thumb_path"]
+                planned["shared"] = shared
+                continue
+
+            # Reuse the outputs of a previous run when source and settings are unchanged
+            if cache is not None:
+                planned["cache_key"] = cache_keys[image_filename]
+                cached = cache.get(planned["cache_key"])
+                if cached is None:
+                    cache_misses += 1
+                else:
+                    cache_hits += 1
+                    for role, path in outputs.items():
+                        if not (os.path.isfile(path)
+                                and os.path.getsize(path) == os.path.getsize(cached[role])):
+                            shutil.copyfile(cached[role], path + ".part")
+                            os.replace(path + ".part", path)
+                    planned["thumb_path"] = cached["thumb"]
+                    continue
+
+            planned["thumb_path"] = thumb_path
+            planned["pending"] = True
+            scheduled[(full_image_path, crop_path)] = planned
+            image_tasks.append((full_image_path, None if thumbnails_in_memory else thumb_path,
+                                crop_path, draft_mode, variant_outputs, headers.get(image_filename)))
+
+        if resumed_rows and status_callback:
+            status_callback(f"Immagini già pronte dall'elaborazione precedente: {resumed_rows}")
+
+        timings.stages["plan"] = time.perf_counter() - plan_start - timings.stages["preflight"]
+
+        # Normalize all rows at once (ALTEZZA, PESO, ...), as plain dictionaries
+        with timings.stage("normalize"):
+            normalized_rows = normalize_dataframe(df, column_mapping).to_dict("records")
+
+        # Image stage: results come back in the same order as image_tasks
+        image_results = iter_image_results(image_tasks, workers, read_ahead_bytes, read_threads)
+
+        # Main processing loop
+        thumb_memory_used = 0
+        loop_start = time.perf_counter()
+        try:
+            for i, (modified_row, planned) in enumerate(zip(normalized_rows, planned_rows)):
+                if cancel_callback and cancel_callback():
+                    raise ProcessingCancelled()
+                if progress_callback:
+                    progress_callback(i+1, total_rows)
+
+                image_path = planned["image_path"]
+                thumb_path = planned["thumb_path"]
+                crop_filename = planned["crop_filename"]
+
+                if not image_path:
+                    missing_images.append("(Vuoto)")
+                    continue
+
+                if thumb_path is None:
+                    missing_images.append(image_path)
+                    continue
+
                 try:
-                    # Open and process image
-                    img = Image.open(full_image_path)
-                    
-                    # 1. Generate thumbnail for Excel
-                    thumb_filename = f"thumb_{i}_{os.path.basename(image_path)}"
-                    thumb_path = os.path.join(thumbs_dir, thumb_filename)
-                    _ = create_thumbnail(img, thumb_path)
-                    
-                    # 2. Generate crop for website
-                    base_name = os.path.splitext(os.path.basename(image_path))[0]
-                    crop_filename = f"{base_name}_dettaglio.jpg"
-                    crop_path = os.path.join(crops_dir, crop_filename)
-                    _ = crop_image(img, crop_path)
-                    
-                    # Create a normalized copy of the row
-                    modified_row = normalize_row(row, column_mapping)
-                    
+                    thumb_data = None
+                    if planned["pending"]:
+                        with timings.stage("images"):
+                            error, thumb_data, image_stats = next(image_results)
+                        timings.add_image(image_stats)
+                        if error:
+                            planned["error"] = error
+                            raise RuntimeError(error)
+                        if cache is not None:
+                            files = {role: (path, None) for role, path in planned["outputs"].items()}
+                            cache.put(planned["cache_key"], dict(files, thumb=(thumb_path, thumb_data)))
+                        if journal is not None:
+                            planned["journal_files"] = dict(planned["outputs"], thumb=thumb_path)
+
+                        # Over the memory budget: keep this thumbnail on disk instead
+                        if thumb_data and thumb_memory_used + len(thumb_data) > thumb_memory_limit:
+                            os.makedirs(thumbs_dir, exist_ok=True)
+                            with open(thumb_path, "wb") as f:
+                                f.write(thumb_data)
+                            thumb_data = None
+                        elif thumb_data:
+                            thumb_memory_used += len(thumb_data)
+                        planned["thumb_data"] = thumb_data
+                    elif planned["shared"] is not None:
+                        shared = planned["shared"]
+                        if shared["error"]:
+                            raise RuntimeError(shared["error"])
+                        thumb_data = shared["thumb_data"]
+                        planned["journal_files"] = shared["journal_files"]
+
                     # Update the FOTO DETTAGLIO field with the crop filename
                     foto_dettaglio_col = column_mapping["FOTO DETTAGLIO"]
                     modified_row[foto_dettaglio_col] = crop_filename
-                    
-                    # Store modified row data for Excel and CSV
-                    valid_rows_data.append((modified_row, thumb_path))
-                    
+
+                    # Record the finished row, and whether its cells changed since the
+                    # last run, before writing it: a row that cannot be recorded is missing
+                    if planned["journal_files"] is not None:
+                        fingerprint = RunJournal.row_fingerprint(
+                            [modified_row[column_mapping[col]] for col in REQUIRED_COLUMNS])
+                        previous = journal.previous_fingerprint(image_path)
+                        if planned["pending"] or previous != fingerprint:
+                            journal.record(image_path, planned["source"],
+                                           planned["journal_files"], fingerprint)
+                        if previous is not None and previous != fingerprint:
+                            changed_rows += 1
+
+                    # Write the row to Excel with exactly the specified columns
+                    excel_row = len(valid_rows_data) + 1  # +1 for header
+                    for j, orig_col in enumerate(REQUIRED_COLUMNS):
+                        mapped_col = column_mapping[orig_col]
+                        worksheet.write(excel_row, j+1, modified_row[mapped_col])
+
+                    # Insert larger thumbnail
+                    image_options = {'x_scale': 0.5, 'y_scale': 0.5}
+                    if thumb_data is not None:
+                        image_options['image_data'] = io.BytesIO(thumb_data)
+                    worksheet.insert_image(excel_row, 0, thumb_path, image_options)
+
+                    # Keep only the values needed for the CSV
+                    valid_rows_data.append(tuple(modified_row[col] for col in csv_columns))
+
                 except Exception as e:
                     if status_callback:
                         status_callback(f"Errore con immagine {image_path}: {str(e)}")
                     missing_images.append(f"{image_path} (errore: {str(e)})")
-            else:
-                missing_images.append(image_path)
-        
-        # Write valid rows to Excel with exactly the specified columns
-        for i, (row, thumb_path) in enumerate(valid_rows_data):
-            excel_row = i + 1  # +1 for header
-            
-            # Write only the required columns in the specified order
-            for j, orig_col in enumerate(REQUIRED_COLUMNS):
-                mapped_col = column_mapping[orig_col]
-                worksheet.write(excel_row, j+1, row[mapped_col])
-            
-            # Insert larger thumbnail
-            worksheet.insert_image(excel_row, 0, thumb_path, {'x_scale': 0.5, 'y_scale': 0.5})
-        
-        # Close Excel workbook
-        workbook.close()
+        finally:
+            image_results.close()
+            if journal is not None:
+                journal.close()
+        # Time of the loop not spent waiting for images: cells and thumbnail insertion
+        timings.stages["rows"] = time.perf_counter() - loop_start - timings.stages.get("images", 0.0)
+        
+        # Close Excel workbook; the run is complete, nothing is left to resume
+        with timings.stage("workbook"):
+            workbook.close()
+        if incremental:
+            # Keep what the next run can reuse, drop rows removed from the sheet
+            referenced = journal.retain({planned["image_path"] for planned in planned_rows})
+            if os.path.isdir(thumbs_dir):
+                for name in os.listdir(thumbs_dir):
+                    if os.path.join(thumbs_dir, name) not in referenced:
+                        os.remove(os.path.join(thumbs_dir, name))
+            journal.close()
+        else:
+            shutil.rmtree(thumbs_dir, ignore_errors=True)
+            if journal is not None:
+                journal.remove()
         
         # Create DataFrame with only valid rows and only required columns
-        valid_df = pd.DataFrame([row for row, _ in valid_rows_data], columns=df.columns)
+        valid_df = pd.DataFrame(valid_rows_data, columns=csv_columns)
         
         # Generate CSV file
         if status_callback:
             status_callback("Genero il file CSV...")
             
-        csv_result = generate_csv_output(valid_df, output_path, column_mapping)
+        with timings.stage("csv"):
+            csv_result = generate_csv_output(valid_df, output_path, column_mapping, csv_chunk_size)
+        
+        timings.bytes_read += os.path.getsize(excel_path)
+        timings.bytes_written += os.path.getsize(excel_output_path)
+        timings.bytes_written += sum(os.path.getsize(path) for path in csv_result.get("csv_path", []))
         
         # Return results
-        return True, {
+        results = {
             "excel_success": True,
             "crops_success": True,
-            "csv_success": True,
+            "csv_success": csv_result["success"],
+            "csv_error": csv_result.get("error"),
             "processed_rows": len(valid_rows_data),
             "missing_images": len(missing_images),
+            "unmatched_images": resolution["missing"],
+            "near_misses": resolution["near_misses"],
+            "image_problems": problems,
             "total_rows": total_rows,
             "excel_path": excel_output_path,
             "csv_path": csv_output_path,
-            "crops_dir": crops_dir
+            "crops_dir": crops_dir,
+            "cache": dict(cache.stats(), hits=cache_hits, misses=cache_misses) if cache is not None else None,
+            "resumed_rows": resumed_rows,
+            "changed_rows": changed_rows,
+            "timings": timings.as_dict(),
+            "report_path": os.path.join(output_path, "report_elaborazione.json")
         }
         
+        # Keep a record of the run next to its outputs
+        write_run_report(results["report_path"], {
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "excel": os.path.abspath(excel_path),
+            "images": os.path.abspath(images_folder),
+            "options": {"workers": workers, "draft_mode": draft_mode, "streaming": streaming,
+                        "thumbnails_in_memory": thumbnails_in_memory, "cache": bool(cache_dir),
+                        "resume": resume, "incremental": incremental},
+            "results": {key: value for key, value in results.items() if key != "timings"},
+            "timings": results["timings"],
+        })
+        return True, results
+        
+    except ProcessingCancelled:
+        if status_callback:
+            status_callback("Elaborazione annullata")
+        return False, {"error": "Elaborazione annullata", "cancelled": True}
+        
     except Exception as e:
         if status_callback:
             status_callback(f"Errore durante l'elaborazione: {str(e)}")
         return False, {"error": str(e)}
     
-def create_thumbnail(img, output_path, max_size=(500, 500), quality=70):
+    finally:
+        # Evict only now: the workbook may embed thumbnails straight from the cache
+        if cache is not None:
+            cache.save()
+            if pin_token:
+                cache.unpin(pin_token)
+    
+def fit_size(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Compute the size an image gets from Image.thumbnail, without touching pixels.
+    
+    Args:
+        size: Current (width, height)
+        max_size: Maximum dimensions (width, height)
+        
+    Returns:
+        Target (width, height), preserving the aspect ratio and never upscaling
+    """
+    width, height = size
+    x, y = int(max_size[0]), int(max_size[1])
+    if x >= width and y >= height:
+        return width, height
+    
+    # Same rounding rule as Pillow, so the output matches Image.thumbnail
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+    
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+def rotated_crop_box(size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Compute the website crop box in the coordinates of the unrotated image.
+    
+    The crop geometry is defined on the image rotated by 90°; mapping the box
+    back lets us crop first and rotate only the (much smaller) cropped region.
+    
+    Args:
+        size: (width, height) of the unrotated image
+        
+    Returns:
+        Crop box (left, upper, right, lower) in unrotated coordinates
+    """
+    width, height = size
+    
+    # Box on the rotated image (width and height swap places)
+    x = (height - CROP_WIDTH)//2
+    y = (width - CROP_HEIGHT)//2
+    left, upper = x, y + CROP_DOWNSHIFT
+    right, lower = x + CROP_WIDTH, y + CROP_HEIGHT + CROP_DOWNSHIFT
+    
+    # Rotating by 90° maps unrotated (x, y) to (y, width - x)
+    return (width - lower, left, width - upper, right)
+
+def make_thumbnail(img, max_size=THUMB_SIZE, source_size=None, timings=None):
+    """
+    Build the rotated Excel thumbnail of an image.
+    
+    Args:
+        img: PIL Image object (possibly decoded at reduced resolution)
+        max_size: Maximum dimensions (width, height)
+        source_size: Full-resolution (width, height) of the source, when img
+            was decoded in draft mode; the output size is computed from it
+        timings: Optional dictionary operation -> seconds to add to
+        
+    Returns:
+        The thumbnail as a new PIL Image
+    """
+    width, height = source_size or img.size
+    
+    # Resize to fit within max_size while preserving aspect ratio,
+    # sized for the rotated image but done before rotating
+    thumb_width, thumb_height = fit_size((height, width), max_size)
+    if (thumb_height, thumb_width) != img.size:
+        with timed(timings, "resize"):
+            thumb_img = img.resize((thumb_height, thumb_width), Image.LANCZOS, reducing_gap=2.0)
+    else:
+        thumb_img = img
+    
+    # Rotate the small image
+    with timed(timings, "rotate"):
+        return thumb_img.transpose(Image.ROTATE_90)
+
+def make_crop(img, max_size=CROP_SIZE, source_size=None, timings=None):
+    """
+    Build the rotated website crop of an image.
+    
+    Args:
+        img: PIL Image object (possibly decoded at reduced resolution)
+        max_size: Maximum dimensions after cropping
+        source_size: Full-resolution (width, height) of the source, when img
+            was decoded in draft mode; the crop box and output size are
+            computed from it
+        timings: Optional dictionary operation -> seconds to add to
+        
+    Returns:
+        The cropped image as a new PIL Image
+    """
+    return make_crop_variants(img, [max_size], source_size, timings)[0]
+
+def make_crop_variants(img, sizes, source_size=None, timings=None):
+    """
+    Build the rotated website crop of an image at several maximum sizes.
+    
+    The image is cropped and rotated once. The default crop (sizes[0]) is
+    always resampled from the cropped region, so it is the same image
+    make_crop returns. The other sizes are produced from the largest down,
+    each resampled from the smallest output already made that is at least
+    twice as large, or else from the cropped region (progressive
+    downsampling).
+    
+    Args:
+        img: PIL Image object (possibly decoded at reduced resolution)
+        sizes: Maximum dimensions of each output
+        source_size: Full-resolution (width, height) of the source, when img
+            was decoded in draft mode; the crop box and output sizes are
+            computed from it
+        timings: Optional dictionary operation -> seconds to add to
+        
+    Returns:
+        List of new PIL Images, in the order of sizes
+    """
+    source_size = source_size or img.size
+    box = rotated_crop_box(source_size)
+    
+    # Output sizes are fixed by the full-resolution crop, whatever the decode scale
+    crop_size = (box[3] - box[1], box[2] - box[0])
+    target_sizes = [fit_size(crop_size, max_size) for max_size in sizes]
+    
+    if source_size != img.size:
+        scale = img.width / source_size[0]
+        box = tuple(v * scale for v in box)
+    
+    # Apply the crop on the unrotated image and rotate only the cropped region
+    with timed(timings, "crop"):
+        cropped_img = img.crop(box)
+    with timed(timings, "rotate"):
+        cropped_img = cropped_img.transpose(Image.ROTATE_90)
+    
+    outputs = [None] * len(sizes)
+    produced = []  # outputs made so far, largest first
+    for n in sorted(range(len(sizes)), key=lambda n: target_sizes[n], reverse=True):
+        target_size = target_sizes[n]
+        source = cropped_img
+        for candidate in (produced if n else []):
+            if (candidate.size == target_size
+                    or (candidate.width >= 2 * target_size[0] and candidate.height >= 2 * target_size[1])):
+                source = candidate
+        
+        # Resize if needed
+        if source.size != target_size:
+            with timed(timings, "resize"):
+                outputs[n] = source.resize(target_size, Image.LANCZOS, reducing_gap=2.0)
+        else:
+            outputs[n] = source
+        produced.append(outputs[n])
+    return outputs
+
+def save_image_atomically(img, output_path: str, **save_options) -> None:
+    """
+    Save an image under a temporary name and move it into place, so an
+    interrupted save never leaves a truncated file under the final name.
+    
+    The temporary name is unique to the writing process and thread, and does
+    not end in an image extension, so concurrent writers of the same file
+    never share it and a leftover one is never taken for a finished image.
+    The format is the format save option, or else the one of output_path's
+    extension.
+    """
+    if "format" not in save_options:
+        ext = os.path.splitext(output_path)[1].lower()
+        save_options["format"] = Image.registered_extensions().get(ext, "JPEG")
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        img.save(tmp_path, **save_options)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def create_thumbnail(img, output_path, max_size=THUMB_SIZE, quality=THUMB_QUALITY, source_size=None,
+                     timings=None):
     """
     Create a thumbnail from an image and save it.
     
     Args:
         img: PIL Image object to thumbnail
-        output_path: Path to save the thumbnail
+        output_path: Path to save the thumbnail, or a binary buffer
+            (written in the format of the source image)
         max_size: Maximum dimensions (width, height)
         quality: JPEG quality (0-100)
+        source_size: Full-resolution size when img was decoded in draft mode
+        timings: Optional dictionary operation -> seconds to add to
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        # Make sure the output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Create a copy to avoid modifying the original
-        thumb_img = img.copy()
-        # Rotate image if needed
-        thumb_img = thumb_img.rotate(90, expand=True)
-        # Resize to fit within max_size while preserving aspect ratio
-        thumb_img.thumbnail(max_size, Image.LANCZOS)
+        thumb_img = make_thumbnail(img, max_size, source_size, timings)
         
         # Save the thumbnail
-        thumb_img.save(output_path, optimize=True, quality=quality)
+        with timed(timings, "encode"):
+            if isinstance(output_path, str):
+                # Make sure the output directory exists
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                save_image_atomically(thumb_img, output_path, optimize=True, quality=quality)
+            else:
+                thumb_img.save(output_path, format=img.format or "JPEG", optimize=True, quality=quality)
         
         return True
     except Exception as e:
         print(f"Error creating thumbnail: {str(e)}")
         return False
 
-def crop_image(img, output_path, max_size=(1000, 1000), quality=80):
+def crop_image(img, output_path, max_size=CROP_SIZE, quality=CROP_QUALITY, source_size=None,
+               timings=None, variants=None):
     """
     Crop an image according to specific parameters and save it.
     
@@ -700,6 +2445,10 @@ def crop_image(img, output_path, max_size=(1000, 1000), quality=80):
         output_path: Path to save the cropped image
         max_size: Maximum dimensions after cropping
         quality: JPEG quality (0-100)
+        source_size: Full-resolution size when img was decoded in draft mode
+        timings: Optional dictionary operation -> seconds to add to
+        variants: Optional list of (output_path, variant) pairs, with variants
+            from normalize_crop_variants, written from the same crop
         
     Returns:
         True if successful, False otherwise
@@ -708,32 +2457,192 @@ def crop_image(img, output_path, max_size=(1000, 1000), quality=80):
         # Make sure the output directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # Apply crop
-        
-        crop_width = 3648/2-300
-        crop_height = 4864/2-300
-        downshift = -200
-        img = img.rotate(90, expand=True)
-        
-        # Calculate crop coordinates
-        x = (img.width - crop_width)//2
-        y = (img.height - crop_height)//2
-        crop_box = (x, y+downshift, x+crop_width, y+crop_height+downshift)
-        
-        # Apply the crop
-        cropped_img = img.crop(crop_box)
-        
-        # Resize if needed
-        cropped_img.thumbnail(max_size, Image.LANCZOS)
+        variants = variants or []
+        sizes = [max_size] + [variant["size"] for _, variant in variants]
+        cropped_img, *variant_imgs = make_crop_variants(img, sizes, source_size, timings)
         
         # Save the cropped image
-        cropped_img.save(output_path, format="JPEG", quality=quality)
+        with timed(timings, "encode"):
+            save_image_atomically(cropped_img, output_path, format="JPEG", quality=quality)
+            for (variant_path, variant), variant_img in zip(variants, variant_imgs):
+                save_image_atomically(variant_img, variant_path, format=variant["format"],
+                                      quality=variant["quality"])
         
         return True
     except Exception as e:
         print(f"Error cropping image: {str(e)}")
         return False
 
+def draft_decode(img, thumb_size=THUMB_SIZE, crop_size=CROP_SIZE) -> Tuple[int, int]:
+    """
+    Ask libjpeg for a DCT-scaled decode (1/2, 1/4 or 1/8) that still covers
+    both outputs: the whole image must stay at least as large as the
+    thumbnail, and the crop box at least as large as the crop.
+    
+    Only JPEG sources support this; other formats are left untouched.
+    Must be called before the image is loaded.
+    
+    Args:
+        img: PIL Image object, opened but not loaded
+        thumb_size: Maximum thumbnail dimensions
+        crop_size: Maximum crop dimensions
+        
+    Returns:
+        The full-resolution (width, height) of the source
+    """
+    source_size = img.size
+    if img.format != "JPEG":
+        return source_size
+    
+    width, height = source_size
+    
+    # Thumbnail: whole image (unrotated) down to the thumbnail size
+    thumb_width, thumb_height = fit_size((height, width), thumb_size)
+    
+    # Crop: the crop box must still reach the crop size after scaling
+    box = rotated_crop_box(source_size)
+    box_width, box_height = box[2] - box[0], box[3] - box[1]
+    crop_width, crop_height = fit_size((box_height, box_width), crop_size)
+    needed = max(crop_height / box_width, crop_width / box_height)
+    
+    requested = (max(thumb_height, math.ceil(width * needed)),
+                 max(thumb_width, math.ceil(height * needed)))
+    img.draft(None, requested)
+    return source_size
+
+def transform_image(img, thumb_path, crop_path,
+                    thumb_size=THUMB_SIZE, thumb_quality=THUMB_QUALITY,
+                    crop_size=CROP_SIZE, crop_quality=CROP_QUALITY,
+                    draft=False, timings=None, crop_variants=None) -> Tuple[bool, bool]:
+    """
+    Build the Excel thumbnail and the website crop from a single decode.
+    
+    The source is decoded once; both outputs are resized from that buffer in
+    unrotated coordinates and only the small results are rotated.
+    
+    Args:
+        img: PIL Image object (opened, not necessarily loaded)
+        thumb_path: Path (or binary buffer) to save the thumbnail
+        crop_path: Path to save the cropped image
+        thumb_size: Maximum thumbnail dimensions
+        thumb_quality: Thumbnail JPEG quality (0-100)
+        crop_size: Maximum crop dimensions
+        crop_quality: Crop JPEG quality (0-100)
+        draft: Decode JPEG sources at reduced resolution (see draft_decode)
+        timings: Optional dictionary operation -> seconds to add to
+            (decode, crop, rotate, resize, encode)
+        crop_variants: Optional list of (output_path, variant) pairs of extra
+            crop sizes/formats (see crop_image)
+        
+    Returns:
+        Tuple (thumbnail created, crop created)
+    """
+    # The decode must stay large enough for the largest crop output
+    largest_crop = crop_size
+    for _, variant in crop_variants or []:
+        largest_crop = (max(largest_crop[0], variant["size"][0]), max(largest_crop[1], variant["size"][1]))
+    
+    # Decode once; all outputs read from the same pixels
+    with timed(timings, "decode"):
+        source_size = draft_decode(img, thumb_size, largest_crop) if draft else img.size
+        img.load()
+    
+    crop_ok = crop_image(img, crop_path, crop_size, crop_quality, source_size, timings, crop_variants)
+    thumb_ok = create_thumbnail(img, thumb_path, thumb_size, thumb_quality, source_size, timings)
+    return thumb_ok, crop_ok
+
+def check_draft_quality(image_path: str, thumb_size=THUMB_SIZE, crop_size=CROP_SIZE,
+                        min_psnr: float = 35.0) -> Dict[str, Any]:
+    """
+    Compare draft-mode outputs with the full-resolution LANCZOS outputs.
+    
+    Use it on a sample of real photos before enabling draft mode.
+    
+    Args:
+        image_path: Path to a source image
+        thumb_size: Maximum thumbnail dimensions
+        crop_size: Maximum crop dimensions
+        min_psnr: Minimum PSNR (dB) for the outputs to count as equivalent
+        
+    Returns:
+        Dictionary with the decode scale, the PSNR of thumbnail and crop,
+        and whether both reach min_psnr
+    """
+    def psnr(a, b):
+        a = np.asarray(a.convert("RGB"), dtype=np.float64)
+        b = np.asarray(b.convert("RGB"), dtype=np.float64)
+        mse = np.mean((a - b) ** 2)
+        return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+    
+    with Image.open(image_path) as img:
+        full_thumb = make_thumbnail(img, thumb_size)
+        full_crop = make_crop(img, crop_size)
+    
+    with Image.open(image_path) as img:
+        source_size = draft_decode(img, thumb_size, crop_size)
+        img.load()
+        draft_thumb = make_thumbnail(img, thumb_size, source_size)
+        draft_crop = make_crop(img, crop_size, source_size)
+        scale = source_size[0] / img.width
+    
+    thumb_psnr = psnr(full_thumb, draft_thumb)
+    crop_psnr = psnr(full_crop, draft_crop)
+    return {
+        "scale": scale,
+        "thumbnail_psnr": thumb_psnr,
+        "crop_psnr": crop_psnr,
+        "equivalent": thumb_psnr >= min_psnr and crop_psnr >= min_psnr,
+    }
+
+def smallest_number(values: pd.Series) -> pd.Series:
+    """
+    Replace every value that contains numbers with the smallest of them, as a
+    float ("140/150 cm" -> 140.0, "300 gr - 250" -> 250.0); values without
+    numbers, None and NaN are left unchanged.
+    
+    Args:
+        values: A column of the cleaned DataFrame
+        
+    Returns:
+        The normalized column (object dtype), with the same index
+    """
+    text = values[values.notna()].map(str).astype(object)
+    numbers = text.str.extractall(r'(\d+(?:\.\d+)?)')[0].astype(float)
+    smallest = numbers.groupby(level=0).min()
+    
+    normalized = values.astype(object)
+    normalized.loc[smallest.index] = smallest.to_numpy(dtype=object)
+    return normalized
+
+# Column-wise normalization rules: required column -> function(column) -> normalized column.
+# Add an entry here to normalize another field in the workbook and the CSV.
+NORMALIZATION_RULES = {
+    "ALTEZZA": smallest_number,
+    "PESO": smallest_number,
+}
+
+def normalize_dataframe(df: pd.DataFrame, column_mapping: Dict[str, str],
+                        rules: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Normalize all rows before writing them to the output files, one column
+    at a time. Gives the same values as normalize_row applied to every row.
+    
+    Args:
+        df: Cleaned DataFrame
+        column_mapping: Mapping from canonical column names to actual column names
+        rules: Required column -> normalization function; defaults to
+            NORMALIZATION_RULES
+        
+    Returns:
+        Normalized copy of df
+    """
+    normalized_df = df.copy()
+    for field, rule in (NORMALIZATION_RULES if rules is None else rules).items():
+        if field in column_mapping and column_mapping[field] in df.columns:
+            col = column_mapping[field]
+            normalized_df[col] = rule(df[col])
+    return normalized_df
+
 def normalize_row(row, column_mapping):
     """
     Normalize row data before writing to output files.